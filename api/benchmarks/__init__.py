@@ -0,0 +1,4 @@
+"""
+The `benchmarks` module contains scripts that measure the api against a real database. Run them with
+`python -m api.benchmarks.<name>` (or the matching `make bench-*` target).
+"""
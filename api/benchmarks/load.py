@@ -0,0 +1,484 @@
+"""
+Replays a realistic mix of api traffic with concurrent clients and reports, per route, the throughput, the p50, p95,
+and p99 latency, and the database round trips per request. The results are saved as JSON so that runs on different
+commits can be diffed (`--compare <earlier results>`). Run with `python -m api.benchmarks.load` against a running,
+seeded database (see `api/benchmarks/seed.py`, or pass `--persons` and `--events` to seed first).
+
+The app is driven in-process through its ASGI interface (`--server asgi`, the default) or over HTTP through uvicorn on
+localhost (`--server uvicorn`), which adds the HTTP parsing and the sockets. Either way the app runs in this process,
+which is what lets the round trips be attributed to routes.
+"""
+from api.db.tables.event import Event
+from api.db.tables.person import Person
+from api.server import app
+from .round_trips import RoundTripCounter
+from .seed import EVENT_TYPE_WEIGHTS, seed
+from blacksheep.client import ClientSession
+from blacksheep.contents import JSONContent
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from piccolo.engine import engine_finder
+from typing import Callable, Optional
+from urllib.parse import urlencode
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import threading
+import time
+
+# The number of Person and Event ids read from the database for the clients to pick from
+ID_SAMPLE_SIZE = 10000
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(__file__), "results")
+
+
+class Traffic:
+    """
+    The Persons and Events the clients pick from. It grows with the Persons and Events they create and shrinks with
+    the Events they delete.
+    """
+    def __init__(self, person_ids: list, events: list):
+        self.person_ids = person_ids
+        self.events = events
+
+    def pop_event(self, rng: random.Random) -> Optional[dict]:
+        if not self.events:
+            return None
+        index = rng.randrange(len(self.events))
+        self.events[index], self.events[-1] = self.events[-1], self.events[index]
+        return self.events.pop()
+
+
+class Operation:
+    """
+    A kind of request in a traffic mix. `build` returns (method, path, query, body), or `None` when there is
+    nothing to send it for (e.g. no Event left to delete); `created` is given the response data of a success.
+    """
+    __slots__ = ("route", "build", "created")
+
+    def __init__(self, route: str, build: Callable, created: Optional[Callable] = None):
+        self.route = route
+        self.build = build
+        self.created = created
+
+
+def _event_key(event: dict) -> dict:
+    # 👇 What `DELETE /events/{id}` expects in its body
+    return {"id": str(event["id"]), "event_type": event["event_type"], "person_id": str(event["person_id"])}
+
+
+def _new_person(traffic: Traffic, rng: random.Random):
+    suffix = f"{rng.getrandbits(32):08x}"
+    return "POST", "/persons", None, {
+        "email": f"load.{suffix}@benchmark.mock",
+        "first_name": "Load",
+        "last_name": f"Test {suffix}",
+        "role": "user",
+    }
+
+
+def _new_event(traffic: Traffic, rng: random.Random):
+    return "POST", "/events", None, {
+        "event_type": rng.choices(list(EVENT_TYPE_WEIGHTS), weights=list(EVENT_TYPE_WEIGHTS.values()))[0],
+        "person_id": str(rng.choice(traffic.person_ids)),
+    }
+
+
+def _delete_event(traffic: Traffic, rng: random.Random):
+    event = traffic.pop_event(rng)
+    if event is None:
+        return None
+    return "DELETE", f"/events/{event['id']}", None, event
+
+
+def _event_stats(traffic: Traffic, rng: random.Random):
+    return "GET", "/events/stats", {"bucket": rng.choice(("hour", "day"))}, None
+
+
+OPERATIONS = {operation.route: operation for operation in (
+    Operation("GET /persons", lambda traffic, rng: ("GET", "/persons", {"limit": 20}, None)),
+    Operation("GET /persons/{id}", lambda traffic, rng: ("GET", f"/persons/{rng.choice(traffic.person_ids)}", None, None)),
+    Operation("GET /persons/{id}/summary", lambda traffic, rng: ("GET", f"/persons/{rng.choice(traffic.person_ids)}/summary", None, None)),
+    Operation("POST /persons", _new_person, created=lambda traffic, data: traffic.person_ids.append(data["id"])),
+    Operation("GET /events", lambda traffic, rng: ("GET", "/events", {"person_id": rng.choice(traffic.person_ids), "limit": 20}, None)),
+    Operation("GET /events/{id}", lambda traffic, rng: ("GET", f"/events/{rng.choice(traffic.events)['id']}", None, None) if traffic.events else None),
+    Operation("GET /events/stats", _event_stats),
+    Operation("POST /events", _new_event, created=lambda traffic, data: traffic.events.append(_event_key(data))),
+    Operation("DELETE /events/{id}", _delete_event),
+)}
+
+# 👇 Route -> weight; a client picks each request's route at random with these weights
+TRAFFIC_MIXES = {
+    "read-heavy": {
+        "GET /persons/{id}": 35,
+        "GET /events/{id}": 25,
+        "GET /persons": 5,
+        "GET /events": 15,
+        "GET /persons/{id}/summary": 10,
+        "GET /events/stats": 5,
+        "POST /events": 5,
+    },
+    "mixed": {
+        "GET /persons/{id}": 25,
+        "GET /events/{id}": 15,
+        "GET /persons": 5,
+        "GET /events": 10,
+        "GET /persons/{id}/summary": 5,
+        "GET /events/stats": 5,
+        "POST /events": 25,
+        "POST /persons": 5,
+        "DELETE /events/{id}": 5,
+    },
+    "write-heavy": {
+        "GET /persons/{id}": 10,
+        "GET /events/{id}": 10,
+        "POST /events": 60,
+        "POST /persons": 10,
+        "DELETE /events/{id}": 10,
+    },
+}
+
+
+# 👇 The round trips of the request being handled; set by `RouteRoundTripCounter.middleware`
+_request_round_trips: ContextVar[Optional[list]] = ContextVar("request_round_trips", default=None)
+
+
+class RouteRoundTripCounter(RoundTripCounter):
+    """
+    Counts the round trips of each request and adds them up per route, so that concurrent requests don't mix.
+    """
+    def __init__(self):
+        super().__init__()
+        # 👇 route -> [requests, round trips]
+        self.routes: dict = {}
+
+    def record(self):
+        counted = _request_round_trips.get()
+        if counted is not None:
+            counted[0] += 1
+
+    async def middleware(self, request, handler):
+        counted = [0]
+        token = _request_round_trips.set(counted)
+        try:
+            return await handler(request)
+        finally:
+            _request_round_trips.reset(token)
+            totals = self.routes.setdefault(f"{request.method} {getattr(request, 'route', 'Not Found')}", [0, 0])
+            totals[0] += 1
+            totals[1] += counted[0]
+
+
+class ASGIClient:
+    """
+    Calls the app's ASGI interface directly, as a server would, without a socket in between.
+    """
+    async def request(self, method: str, path: str, query: Optional[dict], body) -> tuple:
+        payload = json.dumps(body, default=str).encode() if body is not None else b""
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())] if payload else []
+        messages = [{"type": "http.request", "body": payload, "more_body": False}]
+        sent = []
+
+        async def receive():
+            return messages.pop() if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await app({
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(query).encode() if query else b"",
+            "headers": headers,
+            "server": ("127.0.0.1", 8080),
+            "client": ("127.0.0.1", 0),
+            "root_path": "",
+        }, receive, send)
+
+        status = next(m["status"] for m in sent if m["type"] == "http.response.start")
+        return status, b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+
+    async def close(self):
+        pass
+
+
+class HTTPClient:
+    """
+    Sends real HTTP requests to the app served by uvicorn on localhost.
+    """
+    def __init__(self, base_url: str):
+        self.session = ClientSession(base_url=base_url, follow_redirects=False)
+
+    async def request(self, method: str, path: str, query: Optional[dict], body) -> tuple:
+        kwargs = {"params": {k: str(v) for k, v in query.items()}} if query else {}
+        if body is not None:
+            kwargs["content"] = JSONContent(body)
+        response = await getattr(self.session, method.lower())(path, **kwargs)
+        return response.status, await response.read() or b""
+
+    async def close(self):
+        await self.session.close()
+
+
+class UvicornThread:
+    """
+    Serves the app with uvicorn on a background thread, with its own event loop, so the clients on the main loop
+    reach it over a socket.
+    """
+    def __init__(self, port: int):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    async def start(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("uvicorn failed to start.")
+            await asyncio.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+class Results:
+    """
+    The latency (in seconds) and status of every request, per route.
+    """
+    def __init__(self):
+        self.latencies: dict = {}
+        self.statuses: dict = {}
+        self.errors: dict = {}
+
+    def add(self, route: str, seconds: float, status: Optional[int]):
+        self.latencies.setdefault(route, []).append(seconds)
+        statuses = self.statuses.setdefault(route, {})
+        statuses[status] = statuses.get(status, 0) + 1
+        if status is None or status >= 500:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+
+async def run_client(client, traffic: Traffic, mix: dict, rng: random.Random, results: Results, deadline: float, budget: list):
+    routes, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline and budget[0] != 0:
+        operation = OPERATIONS[rng.choices(routes, weights=weights)[0]]
+        request = operation.build(traffic, rng)
+        if request is None:
+            continue
+        budget[0] -= 1
+
+        start = time.perf_counter()
+        try:
+            status, body = await client.request(*request)
+        except Exception:
+            status, body = None, b""
+        results.add(operation.route, time.perf_counter() - start, status)
+
+        if operation.created and status is not None and status < 300:
+            operation.created(traffic, json.loads(body)["data"])
+
+
+async def run_clients(client, traffic: Traffic, mix: dict, concurrency: int, seconds: float, requests: int, seed: int) -> tuple:
+    """
+    Runs `concurrency` clients until `seconds` have passed or `requests` requests were sent (0 for no limit), and
+    returns the results and the time it took.
+    """
+    results = Results()
+    budget = [requests or -1]
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_client(client, traffic, mix, random.Random(seed + i), results, start + seconds, budget)
+        for i in range(concurrency)
+    ])
+    return results, time.perf_counter() - start
+
+
+def percentile(ordered: list, p: float) -> float:
+    """
+    The nearest-rank percentile of an already sorted list.
+    """
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(latencies: list, statuses: dict, errors: int, elapsed: float, round_trips: Optional[list]) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 2),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "round_trips_per_request": round(round_trips[1] / round_trips[0], 2) if round_trips and round_trips[0] else None,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=lambda s: str(s[0]))},
+    }
+
+
+def report(results: Results, elapsed: float, counter: RouteRoundTripCounter) -> dict:
+    routes = {
+        route: summarize(latencies, results.statuses[route], results.errors.get(route, 0), elapsed, counter.routes.get(route))
+        for route, latencies in sorted(results.latencies.items())
+    }
+    every_request = [seconds for latencies in results.latencies.values() for seconds in latencies]
+    all_statuses: dict = {}
+    for statuses in results.statuses.values():
+        for status, count in statuses.items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+    round_trips = [sum(t[0] for t in counter.routes.values()), sum(t[1] for t in counter.routes.values())]
+    total = summarize(every_request, all_statuses, sum(results.errors.values()), elapsed, round_trips) if every_request else None
+    return {"routes": routes, "total": total}
+
+
+def print_report(summary: dict, previous: Optional[dict] = None):
+    print(f"\n{'Route':<28}{'Requests':>10}{'Errors':>8}{'Req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'Round trips':>13}")
+    rows = list(summary["routes"].items()) + ([("Total", summary["total"])] if summary["total"] else [])
+    for route, r in rows:
+        round_trips = "-" if r["round_trips_per_request"] is None else r["round_trips_per_request"]
+        print(f"{route:<28}{r['requests']:>10}{r['errors']:>8}{r['throughput_rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{round_trips:>13}")
+
+    if previous is None:
+        return
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('timestamp')}); negative latency changes are improvements")
+    print(f"{'Route':<28}{'Req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    previous_rows = dict(previous["routes"], Total=previous.get("total"))
+    for route, r in rows:
+        before = previous_rows.get(route)
+        if not before:
+            continue
+        changes = [_change(before[k], r[k]) for k in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")]
+        print(f"{route:<28}" + "".join(f"{c:>10}" for c in changes))
+
+
+def _change(before: float, after: float) -> str:
+    return f"{(after - before) / before * 100:+.1f}%" if before else "-"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def app_settings() -> dict:
+    """
+    The settings that change how the routes behave, so that results are only compared like for like.
+    """
+    from api.services import cache, ingestion, logs, metrics, persons, serialization
+
+    return {
+        "EVENT_WRITE_BEHIND": ingestion.EVENT_WRITE_BEHIND,
+        "JSON_SERIALIZER": serialization.JSON_SERIALIZER,
+        "LOG_LEVEL": logs.LOG_LEVEL,
+        "METRICS": metrics.METRICS,
+        "PERSON_EVENTS_PROJECTION": persons.PERSON_EVENTS_PROJECTION,
+        "RESPONSE_CACHE": cache.RESPONSE_CACHE,
+    }
+
+
+async def prepare_traffic(args) -> Traffic:
+    """
+    Seeds the database if asked to, and reads the ids the clients pick from.
+    """
+    engine = engine_finder()
+    await engine.start_connection_pool()
+    try:
+        if args.persons or args.events:
+            seeded = await seed(args.persons, args.events, seed=args.seed)
+            print(f"Seeded {seeded['persons']} Persons and {seeded['events']} Events in {seeded['seconds']}s")
+        persons = await Person.select(Person.id).limit(ID_SAMPLE_SIZE).run()
+        events = await Event.select(Event.id, Event.event_type, Event.person_id).limit(ID_SAMPLE_SIZE).run()
+    finally:
+        await engine.close_connection_pool()
+
+    if not persons:
+        raise SystemExit("There are no Persons to read. Seed the database first (`make bench-seed`, or pass --persons).")
+    return Traffic(
+        person_ids=[str(p["id"]) for p in persons],
+        events=[_event_key(e) for e in events],
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replays a mix of api traffic and reports throughput, latency, and round trips per route.")
+    parser.add_argument("--server", choices=("asgi", "uvicorn"), default="asgi", help="Call the app in-process through ASGI, or over HTTP through uvicorn.")
+    parser.add_argument("--port", type=int, default=8081, help="The port uvicorn listens on with `--server uvicorn`.")
+    parser.add_argument("--mix", choices=list(TRAFFIC_MIXES), default="mixed", help="The traffic mix to replay.")
+    parser.add_argument("--concurrency", type=int, default=32, help="The number of clients sending requests at the same time.")
+    parser.add_argument("--seconds", type=float, default=30, help="How long to send requests for.")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0 for no limit).")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of traffic sent (and discarded) before measuring.")
+    parser.add_argument("--persons", type=int, default=0, help="Seed this many Persons before the run.")
+    parser.add_argument("--events", type=int, default=0, help="Seed this many Events before the run.")
+    parser.add_argument("--seed", type=int, default=0, help="Seeds the fake data and the clients' choices.")
+    parser.add_argument("--output", help="Where to save the JSON results (defaults to api/benchmarks/results/).")
+    parser.add_argument("--compare", help="Earlier JSON results to compare this run with.")
+    args = parser.parse_args()
+
+    traffic = await prepare_traffic(args)
+
+    counter = RouteRoundTripCounter()
+    counter.install()
+    # 👇 First, so every other middleware's queries are counted too
+    app.middlewares.insert(0, counter.middleware)
+
+    server = None
+    if args.server == "uvicorn":
+        server = UvicornThread(args.port)
+        await server.start()
+        client = HTTPClient(f"http://127.0.0.1:{args.port}")
+    else:
+        await app.start()
+        client = ASGIClient()
+
+    mix = TRAFFIC_MIXES[args.mix]
+    try:
+        if args.warmup:
+            await run_clients(client, traffic, mix, args.concurrency, args.warmup, 0, args.seed + 1000000)
+            counter.routes.clear()
+        results, elapsed = await run_clients(client, traffic, mix, args.concurrency, args.seconds, args.requests, args.seed)
+    finally:
+        await client.close()
+        if server:
+            server.stop()
+        else:
+            await app.stop()
+
+    summary = report(results, elapsed, counter)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(summary, previous)
+
+    commit = git_commit()
+    timestamp = datetime.now(timezone.utc)
+    output = args.output or os.path.join(RESULTS_DIRECTORY, f"load-{timestamp:%Y%m%dT%H%M%S}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "timestamp": timestamp.isoformat(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            "settings": app_settings(),
+            "seconds": round(elapsed, 3),
+            **summary,
+        }, f, indent=2)
+    print(f"\nSaved the results to {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
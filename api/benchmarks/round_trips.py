@@ -0,0 +1,107 @@
+"""
+Counts the database round trips made by each write route: every statement sent to Postgres, including BEGIN,
+COMMIT, and the reset asyncpg sends when a connection goes back to the pool. Run with
+`python -m api.benchmarks.round_trips` against a running database. It measures the handlers as they are; the counts
+of the handlers before they were merged into single statements haven't been measured, so the reduction is unverified.
+
+It also retries an idempotent `POST /events` the way another worker (or this one, once the response has been evicted)
+would, and exits with an error if that created a second Event; CI runs it with and without `EVENT_PARTITIONING`.
+"""
+from api.db.tables.event import Event
+from api.server import app
+from api.services import idempotent_responses
+from asyncpg.connection import Connection
+from blacksheep.contents import JSONContent
+from blacksheep.testing import TestClient
+import asyncio
+import json
+import uuid
+
+# 👇 Every statement asyncpg sends goes through one of these
+COUNTED_METHODS = ("execute", "executemany", "fetch", "fetchrow", "fetchval")
+
+
+class RoundTripCounter:
+    def __init__(self):
+        self.count = 0
+
+    def record(self):
+        self.count += 1
+
+    def install(self):
+        for name in COUNTED_METHODS:
+            original = getattr(Connection, name)
+
+            def counted(connection, *args, _original=original, **kwargs):
+                self.record()
+                return _original(connection, *args, **kwargs)
+
+            setattr(Connection, name, counted)
+
+
+async def measure(counter: RoundTripCounter, request) -> tuple:
+    counter.count = 0
+    response = await request
+    return response, counter.count
+
+
+async def main():
+    counter = RoundTripCounter()
+    counter.install()
+    await app.start()
+    client = TestClient(app)
+    results = []
+
+    response, round_trips = await measure(counter, client.post("/persons", content=JSONContent({
+        "email": f"round.trips.{uuid.uuid4().hex[:8]}@benchmark.mock",
+        "first_name": "Round",
+        "last_name": "Trips",
+        "role": "user",
+    })))
+    person_id = (await response.json())["data"]["id"]
+    results.append(("POST /persons", response.status, round_trips))
+
+    response, round_trips = await measure(counter, client.post("/events", content=JSONContent({
+        "event_type": "click",
+        "person_id": person_id,
+    })))
+    event = (await response.json())["data"]
+    results.append(("POST /events", response.status, round_trips))
+
+    # 👇 The retry isn't answered from memory, so only the database can turn it away
+    idempotency_key = {"Idempotency-Key": uuid.uuid4().hex}
+    response = await client.post("/events", headers=idempotency_key, content=JSONContent({"event_type": "click", "person_id": person_id}))
+    replayed_event = (await response.json())["data"]
+    idempotent_responses.clear()
+    response, round_trips = await measure(counter, client.post("/events", headers=idempotency_key, content=JSONContent({
+        "event_type": "click",
+        "person_id": person_id,
+    })))
+    results.append(("POST /events (replay)", response.status, round_trips))
+    replays = await Event.count().where(Event.id == replayed_event["id"]).run()
+
+    response, round_trips = await measure(counter, client.post("/events", content=JSONContent({
+        "event_type": "click",
+        "person_id": str(uuid.uuid4()),
+    })))
+    results.append(("POST /events (unknown Person)", response.status, round_trips))
+
+    response, round_trips = await measure(counter, client.delete(f"/events/{event['id']}", content=JSONContent(event)))
+    results.append(("DELETE /events/{id}", response.status, round_trips))
+
+    response, round_trips = await measure(counter, client.delete(f"/persons/{person_id}", content=JSONContent({"id": person_id})))
+    results.append(("DELETE /persons/{id}", response.status, round_trips))
+
+    await app.stop()
+
+    print(f"\n{'Route':<32}{'Status':>8}{'Round trips':>14}")
+    for route, status, round_trips in results:
+        print(f"{route:<32}{status:>8}{round_trips:>14}")
+    print(json.dumps([{"route": r, "status": s, "round_trips": n} for r, s, n in results]))
+
+    if replays != 1:
+        raise SystemExit(f"The replayed `POST /events` left {replays} Events with the id {replayed_event['id']}; expected 1.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
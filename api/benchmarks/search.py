@@ -0,0 +1,200 @@
+"""
+Measures `GET /persons/search` lookups on a large `person` table: the latency (p50, p95, and p99) of the page query the
+route runs, for several kinds of search, and the indexes Postgres used for each. The results are saved as JSON next to
+those of `api/benchmarks/load.py`. Run with `python -m api.benchmarks.search --persons 2000000` against a running
+database (`--persons` bulk-loads that many more Persons first; leave it out to measure the table as it is).
+"""
+from api.db.indexes import create_db_indexes
+from api.db.tables.event import EventType
+from api.db.tables.person import Person, Role
+from api.services import PERSON_EVENTS_PROJECTION, after_cursor, paginate, person_search_select, rebuild_person_event_summaries
+from api.services.pagination import PAGE_SIZE_DEFAULT
+from .load import RESULTS_DIRECTORY, git_commit, percentile
+from datetime import datetime, timedelta, timezone
+from faker import Faker
+from piccolo.engine import engine_finder
+from piccolo.querystring import QueryString
+import argparse
+import asyncio
+import json
+import orjson
+import os
+import random
+import time
+import uuid
+
+# The number of Persons (and signup Events) written with each COPY
+COPY_BATCH_SIZE = 50000
+
+# 👇 Faker takes ~0.1ms a name, far too slow for millions of rows, so names are drawn from pools it fills once
+NAME_POOL_SIZE = 5000
+
+# The number of existing Persons the search queries are made from
+QUERY_SAMPLE_SIZE = 1000
+
+PERSON_COLUMNS = ["id", "datetime_created", "datetime_modified", "email", "events", "first_name", "last_name", "role"]
+EVENT_COLUMNS = ["id", "datetime_created", "event_type", "person_id"]
+
+
+async def bulk_seed_persons(persons: int, seed: int = 0, days: int = 365) -> dict:
+    """
+    Creates `persons` Persons, each with its signup Event, with COPY (a few seconds per million rows), then rebuilds
+    the Event summaries and refreshes the planner statistics. The emails follow `api/benchmarks/seed.py`, so they are
+    unique and as varied as real ones. Returns the number of Persons created and how long it took.
+    """
+    fake = Faker()
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+    first_names = [fake.first_name()[:40] for _ in range(NAME_POOL_SIZE)]
+    last_names = [fake.last_name()[:40] for _ in range(NAME_POOL_SIZE)]
+    domains = [fake.free_email_domain() for _ in range(NAME_POOL_SIZE // 100)]
+    now = datetime.utcnow()
+    since = now - timedelta(days=days)
+
+    start = time.perf_counter()
+    engine = engine_finder()
+    for offset in range(0, persons, COPY_BATCH_SIZE):
+        person_rows, event_rows = [], []
+        for _ in range(min(COPY_BATCH_SIZE, persons - offset)):
+            id, created = uuid.uuid4(), since + (now - since) * rng.random()
+            first_name, last_name = rng.choice(first_names), rng.choice(last_names)
+            signup = (uuid.uuid4(), created, EventType.SIGNUP.value, id)
+            events = [] if PERSON_EVENTS_PROJECTION else [dict(zip(EVENT_COLUMNS, signup))]
+            email = f"{f'{first_name}.{last_name}'[:20].lower()}.{rng.getrandbits(24):06x}@{rng.choice(domains)}"
+            role = Role.ADMIN.value if rng.random() < 0.01 else Role.USER.value
+            person_rows.append((id, created, created, email, orjson.dumps(events).decode(), first_name, last_name, role))
+            event_rows.append(signup)
+
+        async with engine.pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.copy_records_to_table("person", records=person_rows, columns=PERSON_COLUMNS)
+                await connection.copy_records_to_table("event", records=event_rows, columns=EVENT_COLUMNS)
+        print(f"  {offset + len(person_rows)} / {persons} Persons")
+
+    await rebuild_person_event_summaries()
+    await Person.raw('ANALYZE "person"').run()
+    return {"persons": persons, "seconds": round(time.perf_counter() - start, 3)}
+
+
+def search_kinds(sample: list, rng: random.Random) -> dict:
+    """
+    The kinds of search measured, each a function that returns a query made from a random Person of `sample`.
+    """
+    def pick() -> dict:
+        return rng.choice(sample)
+
+    def slice_of(value: str, length: int) -> str:
+        at = rng.randrange(max(1, len(value) - length + 1))
+        return value[at:at + length]
+
+    return {
+        "full email": lambda: pick()["email"],
+        "email substring (6)": lambda: slice_of(pick()["email"].split("@")[0], 6),
+        "last name substring (4)": lambda: slice_of(pick()["last_name"], 4),
+        "first name prefix (2)": lambda: pick()["first_name"][:2],
+        # 👇 Substrings most Persons match, where walking the pagination index beats the trigram indexes
+        "common substring": lambda: rng.choice(["com", "mail", "son"]),
+        "no match": lambda: f"zq{rng.getrandbits(32):08x}",
+    }
+
+
+def _index_names(plan: dict) -> set:
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= _index_names(child)
+    return names
+
+
+async def indexes_used(q: str, limit: int) -> list:
+    # 👇 The same query `paginate` runs for the first page
+    query = after_cursor(person_search_select(q, limit), Person, None).limit(limit + 1)
+    rows = await Person._meta.db.run_querystring(QueryString("EXPLAIN (FORMAT JSON) {}", query.querystrings[0]))
+    plan = rows[0]["QUERY PLAN"]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return sorted(_index_names(plan[0]["Plan"]))
+
+
+async def measure(kinds: dict, queries: int, limit: int) -> dict:
+    """
+    Runs each kind of search `queries` times (one page, as the route does) and summarizes the latencies.
+    """
+    results = {}
+    for kind, make_query in kinds.items():
+        latencies, matches = [], []
+        for _ in range(queries):
+            q = make_query()
+            start = time.perf_counter()
+            rows, _ = await paginate(person_search_select(q, limit), Person, limit=limit, cursor=None)
+            latencies.append(time.perf_counter() - start)
+            matches.append(len(rows))
+        ordered = sorted(latencies)
+        results[kind] = {
+            "queries": queries,
+            "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3),
+            "mean_rows": round(sum(matches) / len(matches), 1),
+            "indexes": await indexes_used(make_query(), limit),
+        }
+    return results
+
+
+def print_report(persons: int, results: dict, target_ms: float):
+    print(f"\nGET /persons/search on {persons} Persons")
+    print(f"{'Search':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rows':>8}  indexes")
+    for kind, r in results.items():
+        mark = "✅" if r["p95_ms"] < target_ms else "❌"
+        print(f"{kind:<26}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['mean_rows']:>8}  {', '.join(r['indexes']) or '-'} {mark}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measures Person search latency on a large `person` table.")
+    parser.add_argument("--persons", type=int, default=0, help="Bulk-load this many Persons (with their signup Events) first.")
+    parser.add_argument("--queries", type=int, default=200, help="The number of searches run of each kind.")
+    parser.add_argument("--limit", type=int, default=PAGE_SIZE_DEFAULT, help="The page size of each search.")
+    parser.add_argument("--target-ms", type=float, default=10, help="The p95 latency each kind of search should stay under.")
+    parser.add_argument("--seed", type=int, default=0, help="Seeds the fake data and the queries.")
+    parser.add_argument("--output", help="Where to save the JSON results (defaults to api/benchmarks/results/).")
+    args = parser.parse_args()
+
+    engine = engine_finder()
+    await engine.start_connection_pool()
+    try:
+        # 👇 The api creates the indexes when it starts; this covers a database it hasn't been started against yet
+        await create_db_indexes()
+        if args.persons:
+            seeded = await bulk_seed_persons(args.persons, seed=args.seed)
+            print(f"Created {seeded['persons']} Persons in {seeded['seconds']}s")
+
+        total = (await Person.raw('SELECT count(*) AS "count" FROM "person"').run())[0]["count"]
+        sample = await Person.raw(
+            'SELECT "email", "first_name", "last_name" FROM "person" ORDER BY random() LIMIT {}', QUERY_SAMPLE_SIZE
+        ).run()
+        if not sample:
+            raise SystemExit("There are no Persons to search. Seed the database first (pass --persons).")
+
+        results = await measure(search_kinds(sample, random.Random(args.seed)), args.queries, args.limit)
+    finally:
+        await engine.close_connection_pool()
+
+    print_report(total, results, args.target_ms)
+
+    commit = git_commit()
+    timestamp = datetime.now(timezone.utc)
+    output = args.output or os.path.join(RESULTS_DIRECTORY, f"search-{timestamp:%Y%m%dT%H%M%S}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "timestamp": timestamp.isoformat(),
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+            "persons": total,
+            "searches": results,
+        }, f, indent=2)
+    print(f"\nSaved the results to {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
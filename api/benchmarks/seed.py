@@ -0,0 +1,117 @@
+"""
+Seeds the database with fake Persons and Events (made with `faker`) for the benchmarks to read and write. The same
+`--seed` always produces the same names, emails, and Event mix (only the ids differ), so runs on different commits
+start from equivalent data. Run with `python -m api.benchmarks.seed --persons 1000 --events 10000` against a
+running database.
+"""
+from api.db.tables.event import EventType
+from api.db.tables.person import Person, Role
+from api.services import EVENT_BATCH_MAX_SIZE, create_person, write_events
+from datetime import datetime, timedelta
+from faker import Faker
+from piccolo.engine import engine_finder
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+# The number of Persons created at the same time; each one is a single statement
+PERSON_CONCURRENCY = 20
+
+# 👇 Roughly what real traffic looks like: mostly clicks, the odd piece of feedback
+EVENT_TYPE_WEIGHTS = {
+    EventType.CLICK.value: 95,
+    EventType.SUBMITTED_FEEDBACK.value: 5,
+}
+
+
+def fake_person(fake: Faker, rng: random.Random, created: datetime) -> Person:
+    first_name, last_name = fake.first_name(), fake.last_name()
+    # 👇 The suffix keeps the emails apart; `Person.email` is at most 40 characters
+    local_part = f"{first_name}.{last_name}"[:20].lower()
+    return Person(
+        id=uuid.uuid4(),
+        datetime_created=created,
+        datetime_modified=created,
+        email=f"{local_part}.{rng.getrandbits(24):06x}@{fake.free_email_domain()}",
+        first_name=first_name[:40],
+        last_name=last_name[:40],
+        role=Role.ADMIN.value if rng.random() < 0.01 else Role.USER.value,
+    )
+
+
+def fake_event(rng: random.Random, person_id, created: datetime) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "datetime_created": created,
+        "event_type": rng.choices(list(EVENT_TYPE_WEIGHTS), weights=list(EVENT_TYPE_WEIGHTS.values()))[0],
+        "person_id": person_id,
+    }
+
+
+async def seed(persons: int, events: int, seed: int = 0, days: int = 30) -> dict:
+    """
+    Creates `persons` Persons (each with its signup Event) and then `events` Events spread across them, all dated
+    within the last `days` days. The writes go through the same services as the api, so the summaries stay in step.
+    Returns the number of rows created and how long it took.
+    """
+    fake = Faker()
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    since = now - timedelta(days=days)
+
+    def moment() -> datetime:
+        return since + (now - since) * rng.random()
+
+    start = time.perf_counter()
+    person_ids = []
+    batch = []
+    for _ in range(persons):
+        person = fake_person(fake, rng, moment())
+        person_ids.append(person.id)
+        batch.append(person)
+        if len(batch) == PERSON_CONCURRENCY:
+            await asyncio.gather(*[create_person(p) for p in batch])
+            batch = []
+    if batch:
+        await asyncio.gather(*[create_person(p) for p in batch])
+
+    if not person_ids and events:
+        person_ids = [p["id"] for p in await Person.select(Person.id).run()]
+    if not person_ids:
+        events = 0
+
+    created_events = 0
+    for offset in range(0, events, EVENT_BATCH_MAX_SIZE):
+        count = min(EVENT_BATCH_MAX_SIZE, events - offset)
+        outcomes = await write_events([fake_event(rng, rng.choice(person_ids), moment()) for _ in range(count)])
+        created_events += sum(1 for reason in outcomes.values() if reason is None)
+
+    return {
+        "persons": persons,
+        "events": created_events,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Seeds the database with fake Persons and Events.")
+    parser.add_argument("--persons", type=int, default=1000, help="The number of Persons to create.")
+    parser.add_argument("--events", type=int, default=10000, help="The number of Events to create (besides the signup Events).")
+    parser.add_argument("--seed", type=int, default=0, help="Seeds the fake data; the same seed makes the same data.")
+    parser.add_argument("--days", type=int, default=30, help="The Events are dated within this many days before now.")
+    args = parser.parse_args()
+
+    engine = engine_finder()
+    await engine.start_connection_pool()
+    try:
+        result = await seed(args.persons, args.events, seed=args.seed, days=args.days)
+    finally:
+        await engine.close_connection_pool()
+    print(f"Created {result['persons']} Persons and {result['events']} Events in {result['seconds']}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
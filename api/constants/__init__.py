@@ -2,6 +2,7 @@
 The `constants` module. The items within this module are re-exported here for clean importing elsewhere.
 """
 
+from .constants import accepted_message as accepted_message
 from .constants import bad_request_message as bad_request_message
 from .constants import custom_response as custom_response
 from .constants import internal_server_error_message as internal_server_error_message
@@ -9,4 +10,5 @@ from .constants import not_created_message as not_created_message
 from .constants import not_found_by_id_message as not_found_by_id_message
 from .constants import not_found_message as not_found_message
 from .constants import route_request_mismatch_message as route_request_mismatch_message
+from .constants import service_unavailable_message as service_unavailable_message
 from .constants import successful_message as successful_message
@@ -1,5 +1,18 @@
-    
-def custom_response(data: any, details: str, message: str, status_code: int):
+
+# 👇 Distinguishes "not a paginated response" from a paginated response on its last page (`next_cursor` of None)
+_NOT_PAGINATED = object()
+
+def custom_response(data: any, details: str, message: str, status_code: int, next_cursor: str = _NOT_PAGINATED):
+    if next_cursor is not _NOT_PAGINATED:
+        return {
+            "data": data,
+            "next_cursor": next_cursor,
+            "response": {
+                "details": details,
+                "message": message,
+                "status": status_code
+            }
+        }
     return {
             "data": data,
             "response": {
@@ -43,8 +56,16 @@ def not_found_by_id_message(ent, id, ex: Exception=None) -> str:
     return f"The {ent} with `id` {id} could not be found. Please ensure the `id` in your request is correct and try again"
 
 
+# ------------------------ Service Unavailable -----------------------------------
+
+def service_unavailable_message(retry_after: int) -> str:
+    return f"The api is too busy to accept this request right now. Please try again in {retry_after} second(s)."
+
 # --------------------------- Success --------------------------------
 
+def accepted_message() -> str:
+    return f"The request was accepted and will be processed shortly"
+
 def successful_message() -> str:
     return f"The request was successful"
 
@@ -0,0 +1,106 @@
+from api.db.indexes import create_db_indexes
+from api.db.notifications import create_event_notify_trigger
+from api.db.partitions import (
+    EVENT_PARTITION_DETACH,
+    EVENT_PARTITIONING,
+    convert_event_table_to_partitioned,
+    create_partitioned_event_table,
+    create_future_event_partitions,
+    event_table_kind,
+    remove_expired_event_partitions,
+)
+from api.db.query_plans import LARGE_TABLES, find_unindexed_scans
+from api.db.tables.event import Event
+from api.db.tables.event_key import EventKey
+from api.db.tables.event_rollup import EventRollup
+from api.db.tables.person import Person
+from api.db.tables.person_event_summary import PersonEventSummary
+from api.services import EVENT_STREAM, rebuild_person_event_summaries
+from piccolo.table import create_db_tables
+import sys
+
+
+async def rebuild_summaries():
+    """
+    Recomputes every Person's Event summary from the `event` table. Run with `piccolo db rebuild_summaries`.
+    """
+    print("Rebuilding Person Event summaries...")
+    await rebuild_person_event_summaries()
+    print("Done.")
+
+
+async def maintain_partitions():
+    """
+    Creates the `event` partitions for the coming months and removes the ones older than `EVENT_RETENTION_MONTHS`.
+    Run with `piccolo db maintain_partitions`.
+    """
+    print("Creating upcoming Event partitions...")
+    await create_future_event_partitions()
+    removed = await remove_expired_event_partitions()
+    verb = "Detached" if EVENT_PARTITION_DETACH else "Dropped"
+    print(f"{verb} {len(removed)} expired Event partition(s): {', '.join(removed) or '-'}")
+
+
+async def partition_events():
+    """
+    Converts an existing, unpartitioned `event` table into one partitioned by month. Run with `piccolo db partition_events`.
+    """
+    if await event_table_kind() != "table":
+        print("The `event` table is already partitioned (or doesn't exist yet); nothing to do.")
+        return
+    print("Partitioning the `event` table...")
+    await create_db_tables(EventKey, if_not_exists=True)
+    await convert_event_table_to_partitioned()
+    await create_db_indexes()
+    # 👇 The new table has no trigger yet
+    if EVENT_STREAM:
+        await create_event_notify_trigger()
+    print("Done.")
+
+
+async def _create_tables():
+    if EVENT_PARTITIONING and await event_table_kind() is None:
+        await create_db_tables(Person, EventKey, if_not_exists=True)
+        await create_partitioned_event_table()
+        await create_future_event_partitions()
+    await create_db_tables(Person, Event, EventRollup, PersonEventSummary, if_not_exists=True)
+
+
+async def create_tables():
+    """
+    Creates the tables (and, with `EVENT_PARTITIONING`, the upcoming `event` partitions) the way the api does when it
+    starts, without the indexes the migrations build. Run with `piccolo db create_tables` before the migrations on a
+    fresh database.
+    """
+    await _create_tables()
+    print("Done.")
+
+
+async def check_query_plans():
+    """
+    EXPLAINs the query behind each route and fails if any of them reads a large table without narrowing it down
+    with an index (a sequential scan, or a walk of a whole index). Run with `piccolo db check_query_plans` against a
+    seeded database (CI seeds one with `api/benchmarks/seed.py` on every push, see `.github/workflows/query-plans.yml`).
+    """
+    # 👇 The tables and indexes are created as the api creates them on start, so the check also runs on an empty database
+    await _create_tables()
+    await create_db_indexes()
+
+    # 👇 Fresh statistics, so the plans are the ones the seeded data would get
+    for table in LARGE_TABLES:
+        exists = await Event.raw("SELECT to_regclass({}) IS NOT NULL AS \"exists\"", table).run()
+        if exists[0]["exists"]:
+            await Event.raw(f'ANALYZE "{table}"').run()
+    events = await Event.count().run()
+    if events == 0:
+        print("The `event` table is empty; seed it (e.g. `make bench-seed`) for plans closer to production's.")
+
+    failures = 0
+    for route, scans in (await find_unindexed_scans()).items():
+        if scans:
+            failures += 1
+            print(f"❌ {route}: {', '.join(scans)}")
+        else:
+            print(f"✅ {route}")
+    if failures:
+        sys.exit(f"{failures} route(s) would read a large table without narrowing it down with an index.")
@@ -0,0 +1,62 @@
+from contextvars import ContextVar
+from piccolo.engine.postgres import PostgresEngine
+from piccolo.querystring import QueryString
+from typing import Optional
+import asyncio
+import time
+
+
+class DBTimer:
+    """
+    The time the current request has spent waiting on the database, and the number of queries it ran.
+    """
+    __slots__ = ("seconds", "queries")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+
+
+# 👇 Set for the duration of each request (see `api/services/logs.py`); None outside a request
+db_timer: ContextVar[Optional[DBTimer]] = ContextVar("db_timer", default=None)
+
+
+class TimedPostgresEngine(PostgresEngine):
+    """
+    A `PostgresEngine` that adds the time every query takes to the current request's `DBTimer`.
+
+    `pool_config` is passed to `asyncpg.create_pool` (e.g. `min_size` and `max_size`) whenever the pool is started; it
+    is kept apart from `config` because that is also used for one-off connections, which don't accept those keys.
+    """
+    def __init__(self, config: dict, pool_config: Optional[dict] = None, **kwargs):
+        super().__init__(config, **kwargs)
+        self.pool_config = pool_config or {}
+
+    async def start_connection_pool(self, **kwargs) -> None:
+        await super().start_connection_pool(**{**self.pool_config, **kwargs})
+
+    async def warm_up_pool(self):
+        """
+        Checks out as many connections as the pool keeps at its minimum size at once and runs a trivial query on each,
+        so that they are all open and known to work before the first request needs one.
+        """
+        if self.pool is None:
+            return
+
+        async def ping():
+            async with self.pool.acquire() as connection:
+                await connection.execute("SELECT 1")
+
+        await asyncio.gather(*[ping() for _ in range(self.pool.get_min_size())])
+
+    async def run_querystring(self, querystring: QueryString, in_pool: bool = True):
+        timer = db_timer.get()
+        if timer is None:
+            return await super().run_querystring(querystring, in_pool=in_pool)
+
+        start = time.perf_counter()
+        try:
+            return await super().run_querystring(querystring, in_pool=in_pool)
+        finally:
+            timer.seconds += time.perf_counter() - start
+            timer.queries += 1
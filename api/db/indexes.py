@@ -0,0 +1,63 @@
+from api.db.tables.event import Event
+from api.db.tables.event_rollup import EventRollup
+from api.db.tables.person import Person
+from api.db.tables.person_event_summary import PersonEventSummary
+
+# 👇 Single-column indexes are declared on the column itself (`index=True`); indexes spanning several columns are
+# declared on the table class as `composite_indexes` (or `unique_composite_indexes`), a list of column-name tuples,
+# and trigram indexes for `LIKE` searches as `trigram_indexes`, a list of column names
+TABLES = [Person, Event, EventRollup, PersonEventSummary]
+
+
+def index_name(table, columns: tuple) -> str:
+    return f"{table._meta.tablename}_{'_'.join(columns)}"
+
+
+def declared_indexes() -> list:
+    """
+    Returns every composite index declared on the table classes as (table, index name, columns, unique).
+    """
+    indexes = []
+    for table in TABLES:
+        for columns in getattr(table, "composite_indexes", []):
+            indexes.append((table, index_name(table, columns), columns, False))
+        for columns in getattr(table, "unique_composite_indexes", []):
+            indexes.append((table, index_name(table, columns), columns, True))
+    return indexes
+
+
+def declared_trigram_indexes() -> list:
+    """
+    Returns every trigram index declared on the table classes as (table, index name, column).
+    """
+    indexes = []
+    for table in TABLES:
+        for column in getattr(table, "trigram_indexes", []):
+            indexes.append((table, f"{index_name(table, (column,))}_trgm", column))
+    return indexes
+
+
+def create_index_ddl(table, name: str, columns: tuple, unique: bool) -> str:
+    column_names = ", ".join(f'"{c}"' for c in columns)
+    return f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{name}" ON {table._meta.get_formatted_tablename()} ({column_names})'
+
+
+def create_trigram_index_ddl(table, name: str, column: str) -> str:
+    # 👇 On the lowercased value, so the index serves case-insensitive matches (`lower(column) LIKE ...`)
+    return f'CREATE INDEX IF NOT EXISTS "{name}" ON {table._meta.get_formatted_tablename()} USING gin (lower("{column}") gin_trgm_ops)'
+
+
+async def create_db_indexes():
+    """
+    Creates the declared composite and trigram indexes that don't exist yet. New indexes should also get a migration
+    (see `api/db/piccolo_migrations`); this keeps a freshly-created database in step with them.
+    """
+    for table, name, columns, unique in declared_indexes():
+        await table.raw(create_index_ddl(table, name, columns, unique)).run()
+
+    trigram_indexes = declared_trigram_indexes()
+    if trigram_indexes:
+        # 👇 `pg_trgm` ships with Postgres and is a trusted extension, so the database owner can create it
+        await trigram_indexes[0][0].raw("CREATE EXTENSION IF NOT EXISTS pg_trgm").run()
+    for table, name, column in trigram_indexes:
+        await table.raw(create_trigram_index_ddl(table, name, column)).run()
@@ -0,0 +1,62 @@
+from api.db.tables.event import Event
+
+# 👇 The channel every new Event is announced on (see `api/services/live.py`, which listens to it)
+EVENT_CREATED_CHANNEL = "event_created"
+
+# 👇 The payload only carries the Event's own columns, so it stays far below the 8000 byte limit of `pg_notify`
+NOTIFY_EVENT_CREATED_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION notify_event_created() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{EVENT_CREATED_CHANNEL}', json_build_object(
+        'id', NEW.id,
+        'datetime_created', NEW.datetime_created,
+        'event_type', NEW.event_type,
+        'person_id', NEW.person_id
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# 👇 Created only when missing, rather than with `CREATE OR REPLACE TRIGGER`, which needs Postgres 14
+NOTIFY_EVENT_CREATED_TRIGGER = (
+    'CREATE TRIGGER "event_notify_created" AFTER INSERT ON "event" '
+    "FOR EACH ROW EXECUTE FUNCTION notify_event_created()"
+)
+
+# 👇 Workers starting together take turns changing the function and trigger, which would otherwise fail with
+# "tuple concurrently updated"
+NOTIFY_LOCK_KEY = 7_007_002
+
+
+async def _event_notify_trigger_exists() -> bool:
+    rows = await Event.raw(
+        "SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgrelid = 'event'::regclass AND tgname = 'event_notify_created') AS \"exists\""
+    ).run()
+    return rows[0]["exists"]
+
+
+async def create_event_notify_trigger():
+    """
+    Makes every insert into the `event` table (from any worker, the write-behind buffer, or outside the api) send a
+    notification on `EVENT_CREATED_CHANNEL`. Notifications are only delivered once the inserting transaction commits.
+    Runs on every start while `EVENT_STREAM` is true (and again after `piccolo db partition_events`); the trigger is
+    only created when it is missing, so the `event` table isn't locked on every start.
+    """
+    async with Event._meta.db.transaction():
+        await Event.raw("SELECT pg_advisory_xact_lock({})", NOTIFY_LOCK_KEY).run()
+        await Event.raw(NOTIFY_EVENT_CREATED_FUNCTION).run()
+        if not await _event_notify_trigger_exists():
+            await Event.raw(NOTIFY_EVENT_CREATED_TRIGGER).run()
+
+
+async def drop_event_notify_trigger():
+    """
+    Removes the trigger (if it exists) while `EVENT_STREAM` is false. Nothing listens then, and every transaction
+    that sends a notification takes Postgres' global notification queue lock as it commits, so Event writes would
+    wait on each other for nothing.
+    """
+    async with Event._meta.db.transaction():
+        await Event.raw("SELECT pg_advisory_xact_lock({})", NOTIFY_LOCK_KEY).run()
+        if await _event_notify_trigger_exists():
+            await Event.raw('DROP TRIGGER "event_notify_created" ON "event"').run()
@@ -0,0 +1,182 @@
+from api.db.tables.event import Event
+from api.db.tables.event_key import EventKey
+from api.db.tables.event_rollup import EventRollup
+from datetime import date, datetime
+from typing import Optional
+import os
+import re
+
+# 👇 When true, the `event` table is range-partitioned by `datetime_created`, one partition per month
+EVENT_PARTITIONING = os.environ.get("EVENT_PARTITIONING", "false").lower() == "true"
+
+# The number of future months that always have a partition ready
+EVENT_PARTITIONS_AHEAD = int(os.environ.get("EVENT_PARTITIONS_AHEAD", 3))
+
+# Partitions that ended more than this many months ago are removed; 0 keeps every partition
+EVENT_RETENTION_MONTHS = int(os.environ.get("EVENT_RETENTION_MONTHS", 0))
+
+# 👇 When true, expired partitions are detached (left as standalone tables to be archived) rather than dropped
+EVENT_PARTITION_DETACH = os.environ.get("EVENT_PARTITION_DETACH", "false").lower() == "true"
+
+PARTITION_NAME = re.compile(r"^event_p(\d{4})(\d{2})$")
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"event_p{month.year:04d}{month.month:02d}"
+
+
+def partitioned_event_ddl() -> str:
+    """
+    The DDL of the `event` table, partitioned by `datetime_created`. The columns come from the `Event` table class;
+    only the primary key changes, because Postgres requires the partition key in every unique constraint.
+    """
+    columns = [c.ddl.replace(" PRIMARY KEY UNIQUE", "") if c is Event.id else c.ddl for c in Event._meta.columns]
+    return (
+        f'CREATE TABLE IF NOT EXISTS "event" ({", ".join(columns)}, PRIMARY KEY ("id", "datetime_created")) '
+        'PARTITION BY RANGE ("datetime_created")'
+    )
+
+
+async def event_table_kind() -> Optional[str]:
+    """
+    Returns 'partitioned' or 'table' depending on how the `event` table exists, or `None` if it doesn't yet.
+    """
+    rows = await Event.raw("SELECT relkind FROM pg_class WHERE oid = to_regclass('event')").run()
+    if not rows:
+        return None
+    return "partitioned" if rows[0]["relkind"] == "p" else "table"
+
+
+def event_column_names() -> str:
+    return ", ".join(f'"{c._meta.db_column_name}"' for c in Event._meta.columns)
+
+
+async def create_event_partition(month: date):
+    """
+    Creates the partition for `month` unless it exists. Events already in `event_default` for that month (e.g. ones
+    created with a `datetime_created` far ahead) would stop Postgres from creating it, so they are moved into it:
+    `event_default` is detached, the partition is created as a plain table and filled, and both are attached again,
+    in one transaction. Writes to `event` are blocked while this runs, which only happens when there are such Events.
+    """
+    name, start, end = partition_name(month), month.isoformat(), _add_months(month, 1).isoformat()
+    exists = await Event.raw("SELECT to_regclass({}) IS NOT NULL AS \"exists\"", name).run()
+    if exists[0]["exists"]:
+        return
+
+    bounds = f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    in_month = f"\"datetime_created\" >= '{start}' AND \"datetime_created\" < '{end}'"
+    has_default = await Event.raw("SELECT to_regclass('event_default') IS NOT NULL AS \"exists\"").run()
+    stranded = has_default[0]["exists"] and (
+        await Event.raw(f'SELECT EXISTS (SELECT 1 FROM "event_default" WHERE {in_month}) AS "stranded"').run()
+    )[0]["stranded"]
+    if not stranded:
+        await Event.raw(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "event" {bounds}').run()
+        return
+
+    columns = event_column_names()
+    async with Event._meta.db.transaction():
+        await Event.raw('ALTER TABLE "event" DETACH PARTITION "event_default"').run()
+        # 👇 A plain table has no copy of the insert trigger, so moving the Events doesn't announce them as new ones;
+        # attaching it gives it the partitioned table's indexes, constraints, and triggers
+        await Event.raw(f'CREATE TABLE "{name}" (LIKE "event" INCLUDING DEFAULTS)').run()
+        await Event.raw(f'INSERT INTO "{name}" ({columns}) SELECT {columns} FROM "event_default" WHERE {in_month}').run()
+        await Event.raw(f'DELETE FROM "event_default" WHERE {in_month}').run()
+        await Event.raw(f'ALTER TABLE "event" ATTACH PARTITION "{name}" {bounds}').run()
+        await Event.raw('ALTER TABLE "event" ATTACH PARTITION "event_default" DEFAULT').run()
+
+
+async def create_partitioned_event_table():
+    """
+    Creates the partitioned `event` table (with a default partition for Events outside every monthly partition)
+    and the partitions from this month up to `EVENT_PARTITIONS_AHEAD` months ahead.
+    """
+    await Event.raw(partitioned_event_ddl()).run()
+    await Event.raw('CREATE TABLE IF NOT EXISTS "event_default" PARTITION OF "event" DEFAULT').run()
+    await create_future_event_partitions()
+
+
+async def create_future_event_partitions():
+    this_month = datetime.utcnow().date().replace(day=1)
+    for months in range(EVENT_PARTITIONS_AHEAD + 1):
+        await create_event_partition(_add_months(this_month, months))
+
+
+async def remove_expired_event_partitions() -> list:
+    """
+    Drops (or, with `EVENT_PARTITION_DETACH`, detaches) every monthly partition that ended more than
+    `EVENT_RETENTION_MONTHS` months ago and returns their names. Removing a partition is a catalog change,
+    not a DELETE, so it costs the same however many Events it holds.
+
+    The Event rollups and `event_key` rows of a removed month are deleted with it (in the same transaction), so
+    `GET /events/stats` keeps agreeing with the `event` table. Person summaries are left alone, so they keep counting the removed Events.
+    """
+    if EVENT_RETENTION_MONTHS <= 0:
+        return []
+
+    cutoff = _add_months(datetime.utcnow().date().replace(day=1), -EVENT_RETENTION_MONTHS)
+    partitions = await Event.raw(
+        "SELECT c.relname AS \"name\" FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'event'::regclass"
+    ).run()
+
+    removed = []
+    for partition in partitions:
+        match = PARTITION_NAME.match(partition["name"])
+        if not match:
+            continue
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if _add_months(month, 1) > cutoff:
+            continue
+
+        async with Event._meta.db.transaction():
+            if EVENT_PARTITION_DETACH:
+                await Event.raw(f'ALTER TABLE "event" DETACH PARTITION "{partition["name"]}"').run()
+            else:
+                await Event.raw(f'DROP TABLE "{partition["name"]}"').run()
+            start, end = datetime.combine(month, datetime.min.time()), datetime.combine(_add_months(month, 1), datetime.min.time())
+            # 👇 Minute, hour, and day buckets all fall entirely inside one month
+            await EventRollup.raw(
+                'DELETE FROM "event_rollup" WHERE "datetime_bucket" >= {} AND "datetime_bucket" < {}', start, end
+            ).run()
+            await EventKey.raw(
+                'DELETE FROM "event_key" WHERE "datetime_created" >= {} AND "datetime_created" < {}', start, end
+            ).run()
+        removed.append(partition["name"])
+
+    return removed
+
+
+async def convert_event_table_to_partitioned():
+    """
+    Moves an existing, unpartitioned `event` table into a partitioned one (with a partition for every month that
+    has Events) in a single transaction. Writes to `event` are blocked while this runs.
+    """
+    async with Event._meta.db.transaction():
+        await Event.raw('ALTER TABLE "event" RENAME TO "event_unpartitioned"').run()
+        # 👇 Index names are unique per schema, so the old table's indexes (primary key included) make way for the new ones
+        for row in await Event.raw(
+            "SELECT indexname AS \"name\" FROM pg_indexes WHERE tablename = 'event_unpartitioned'"
+        ).run():
+            await Event.raw(f'ALTER INDEX "{row["name"]}" RENAME TO "{row["name"]}_unpartitioned"').run()
+
+        await create_partitioned_event_table()
+        months = await Event.raw(
+            'SELECT DISTINCT date_trunc(\'month\', "datetime_created")::date AS "month" FROM "event_unpartitioned"'
+        ).run()
+        for row in months:
+            await create_event_partition(row["month"])
+
+        # 👇 By name, so the copy doesn't depend on the two tables listing their columns in the same order
+        columns = event_column_names()
+        await Event.raw(f'INSERT INTO "event" ({columns}) SELECT {columns} FROM "event_unpartitioned"').run()
+        # 👇 The partitioned primary key doesn't make ids unique on its own, so the existing ones are claimed as well
+        await EventKey.raw(
+            'INSERT INTO "event_key" ("id", "datetime_created") SELECT "id", "datetime_created" FROM "event_unpartitioned" '
+            'ON CONFLICT DO NOTHING'
+        ).run()
+        await Event.raw('DROP TABLE "event_unpartitioned"').run()
@@ -1,5 +1,6 @@
 import os
 
+from api.db.commands import check_query_plans, create_tables, maintain_partitions, partition_events, rebuild_summaries
 from piccolo.conf.apps import AppConfig, table_finder
 
 
@@ -14,5 +15,5 @@ APP_CONFIG = AppConfig(
     table_classes=table_finder(modules=["api.db.tables"],
     exclude_imported=True),
     migration_dependencies=[],
-    commands=[],
+    commands=[check_query_plans, create_tables, maintain_partitions, partition_events, rebuild_summaries],
 )
\ No newline at end of file
@@ -0,0 +1,89 @@
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.table import Table
+
+
+# 👇 Frozen copies of the composite indexes declared on `Person` and `Event` when this migration was written;
+# later changes to `composite_indexes` need a migration of their own
+INDEXES = [
+    ("event", "event_datetime_created_id", ("datetime_created", "id")),
+    ("event", "event_event_type_datetime_created", ("event_type", "datetime_created")),
+    ("event", "event_person_id_datetime_created", ("person_id", "datetime_created")),
+    ("person", "person_datetime_created_id", ("datetime_created", "id")),
+]
+
+
+class RawTable(Table):
+    pass
+
+
+ID = '2026-10-18T09:30:00:000000'
+VERSION = '1.36.0'
+DESCRIPTION = 'Add composite indexes for the Event and Person filters'
+
+
+async def index_state(name: str):
+    """
+    Returns `None` if the index doesn't exist, or whether it is valid (a failed concurrent build leaves an invalid one).
+    """
+    rows = await RawTable.raw(
+        "SELECT i.indisvalid AS \"valid\" FROM pg_index i WHERE i.indexrelid = to_regclass({})", name
+    ).run()
+    return rows[0]["valid"] if rows else None
+
+
+async def create_index_concurrently(table: str, name: str, column_names: str):
+    """
+    Builds an index without blocking writes to the table. A leftover invalid index (from an interrupted build) is
+    dropped and built again.
+    """
+    valid = await index_state(name)
+    if valid:
+        return
+    if valid is False:
+        await RawTable.raw(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"').run()
+    await RawTable.raw(f'CREATE INDEX CONCURRENTLY "{name}" ON "{table}" ({column_names})').run()
+
+
+async def forwards():
+    # 👇 `CREATE INDEX CONCURRENTLY` can't run inside a transaction, so this migration isn't wrapped in one
+    manager = MigrationManager(migration_id=ID, app_name="db", description=DESCRIPTION, wrap_in_transaction=False)
+
+    async def create_indexes():
+        for table, name, columns in INDEXES:
+            # 👇 The api creates the tables when it starts; recording this migration as applied without them would
+            # leave the indexes missing for good
+            kind = await RawTable.raw(
+                "SELECT relkind::text AS \"kind\" FROM pg_class WHERE oid = to_regclass({})", table
+            ).run()
+            if not kind:
+                raise RuntimeError(
+                    f"The `{table}` table doesn't exist yet. Start the api (or run `piccolo db create_tables`) first, "
+                    "then run the migrations again."
+                )
+            column_names = ", ".join(f'"{c}"' for c in columns)
+
+            if kind[0]["kind"] != "p":
+                await create_index_concurrently(table, name, column_names)
+                continue
+
+            # 👇 A partitioned table can't be indexed concurrently: its index is created on the table alone (which
+            # is instant), each partition is indexed concurrently, and the partition indexes are attached to it
+            if await index_state(name):
+                continue
+            await RawTable.raw(f'CREATE INDEX IF NOT EXISTS "{name}" ON ONLY "{table}" ({column_names})').run()
+            partitions = await RawTable.raw(
+                "SELECT c.relname AS \"name\" FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass({})", table
+            ).run()
+            for partition in partitions:
+                partition_index = f'{partition["name"]}_{"_".join(columns)}'
+                await create_index_concurrently(partition["name"], partition_index, column_names)
+                await RawTable.raw(f'ALTER INDEX "{name}" ATTACH PARTITION "{partition_index}"').run()
+
+    async def drop_indexes():
+        for _, name, _ in INDEXES:
+            await RawTable.raw(f'DROP INDEX IF EXISTS "{name}"').run()
+
+    manager.add_raw(create_indexes)
+    manager.add_raw_backwards(drop_indexes)
+    return manager
@@ -0,0 +1,55 @@
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.table import Table
+
+
+# 👇 Frozen copies of the trigram indexes declared on `Person` when this migration was written;
+# later changes to `trigram_indexes` need a migration of their own
+INDEXES = [
+    ("person", "person_email_trgm", "email"),
+    ("person", "person_first_name_trgm", "first_name"),
+    ("person", "person_last_name_trgm", "last_name"),
+]
+
+
+class RawTable(Table):
+    pass
+
+
+ID = '2026-10-18T11:00:00:000000'
+VERSION = '1.36.0'
+DESCRIPTION = 'Add trigram indexes for the Person search'
+
+
+async def forwards():
+    # 👇 `CREATE INDEX CONCURRENTLY` can't run inside a transaction, so this migration isn't wrapped in one
+    manager = MigrationManager(migration_id=ID, app_name="db", description=DESCRIPTION, wrap_in_transaction=False)
+
+    async def create_indexes():
+        await RawTable.raw("CREATE EXTENSION IF NOT EXISTS pg_trgm").run()
+        for table, name, column in INDEXES:
+            # 👇 The api creates the tables when it starts; recording this migration as applied without them would
+            # leave the indexes missing for good
+            exists = await RawTable.raw("SELECT to_regclass({}) IS NOT NULL AS \"exists\"", table).run()
+            if not exists[0]["exists"]:
+                raise RuntimeError(
+                    f"The `{table}` table doesn't exist yet. Start the api (or run `piccolo db create_tables`) first, "
+                    "then run the migrations again."
+                )
+            # 👇 An interrupted concurrent build leaves an invalid index behind, which is dropped and built again
+            valid = await RawTable.raw(
+                "SELECT i.indisvalid AS \"valid\" FROM pg_index i WHERE i.indexrelid = to_regclass({})", name
+            ).run()
+            if valid and valid[0]["valid"]:
+                continue
+            if valid:
+                await RawTable.raw(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"').run()
+            await RawTable.raw(f'CREATE INDEX CONCURRENTLY "{name}" ON "{table}" USING gin (lower("{column}") gin_trgm_ops)').run()
+
+    async def drop_indexes():
+        # 👇 The extension is left in place; dropping it would take anything else built on it along
+        for _, name, _ in INDEXES:
+            await RawTable.raw(f'DROP INDEX IF EXISTS "{name}"').run()
+
+    manager.add_raw(create_indexes)
+    manager.add_raw_backwards(drop_indexes)
+    return manager
@@ -0,0 +1,89 @@
+from api.db.tables.event import Event, EventType
+from api.db.tables.person import Person
+from api.db.tables.person_event_summary import PersonEventSummary
+from api.services import (
+    after_cursor,
+    create_event_query,
+    delete_event_query,
+    delete_person_query,
+    person_search_select,
+    person_select,
+)
+from api.services.pagination import PAGE_SIZE_DEFAULT, encode_cursor
+from datetime import datetime
+from piccolo.querystring import QueryString
+import json
+import re
+import uuid
+
+# 👇 Tables that grow without bound; a sequential scan of one of these on a request path is a bug
+LARGE_TABLES = ("event", "event_key", "person", "person_event_summary")
+
+# 👇 The partitions of `event` (see `api/db/partitions.py`) count as `event`
+EVENT_PARTITION = re.compile(r"^event_(p\d{6}|default)$")
+
+
+def route_queries() -> list:
+    """
+    Returns (route, query) pairs for the queries the routes run against the large tables, built the same way the
+    routes build them (with made-up ids, since only the plan matters).
+    """
+    id = uuid.uuid4()
+    cursor = encode_cursor({"datetime_created": datetime.utcnow(), "id": id})
+    page = PAGE_SIZE_DEFAULT + 1
+
+    # 👇 Piccolo queries are mutated by `.where()`, so every route gets a fresh one
+    def events():
+        return Event.select(Event.all_columns())
+
+    return [
+        ("GET /persons", after_cursor(person_select(), Person, cursor).limit(page)),
+        ("GET /persons/{id}", person_select().where(Person.id == id).first()),
+        ("GET /persons/search?q=", after_cursor(person_search_select("kate", PAGE_SIZE_DEFAULT, cursor), Person, cursor).limit(page)),
+        ("GET /persons/search?q= (prefix)", after_cursor(person_search_select("ka", PAGE_SIZE_DEFAULT, cursor), Person, cursor).limit(page)),
+        ("GET /persons/{id}/summary", PersonEventSummary.select().where(PersonEventSummary.person_id == id).first()),
+        ("DELETE /persons/{id}", delete_person_query(id)),
+        ("GET /events", after_cursor(events(), Event, cursor).limit(page)),
+        ("GET /events?keyword=", after_cursor(events().where(Event.event_type == EventType.CLICK.value), Event, cursor).limit(page)),
+        ("GET /events?person_id=", after_cursor(events().where(Event.person_id == id), Event, cursor).limit(page)),
+        ("GET /events/{id}", Event.select().where(Event.id == id).first()),
+        # 👇 The Person is checked by the foreign key rather than a lookup; its index backs the check and the summary upsert
+        ("POST /events", create_event_query({"id": id, "datetime_created": datetime.utcnow(), "event_type": EventType.CLICK.value, "person_id": id})),
+        ("DELETE /events/{id}", delete_event_query(id)),
+    ]
+
+
+def _unindexed_scans(plan: dict) -> list:
+    scans = []
+    relation = plan.get("Relation Name", "")
+    if relation in LARGE_TABLES or EVENT_PARTITION.match(relation):
+        if plan.get("Node Type") == "Seq Scan":
+            scans.append(f"sequential scan of {relation}")
+        # 👇 An index scan without a condition walks the whole index, which is no better than a sequential scan
+        elif plan.get("Node Type") in ("Index Scan", "Index Only Scan") and "Index Cond" not in plan:
+            scans.append(f"walk of the whole {plan['Index Name']} index of {relation}")
+    for child in plan.get("Plans", []):
+        scans.extend(_unindexed_scans(child))
+    return scans
+
+
+async def find_unindexed_scans() -> dict:
+    """
+    EXPLAINs every route query and returns a map of each route to the reads of large tables in its plan that no index
+    condition narrows down (an empty list if there are none).
+
+    Sequential scans are switched off for the planner first: on a small table Postgres prefers them even when an
+    index fits, but with them switched off it only falls back to one when no index can serve the query. Walking a
+    whole index is then still possible, so index scans must also have an index condition.
+    """
+    results = {}
+    async with Event._meta.db.transaction():
+        await Event.raw("SET LOCAL enable_seqscan = off").run()
+        for route, query in route_queries():
+            explain = QueryString("EXPLAIN (FORMAT JSON) {}", query.querystrings[0])
+            rows = await Event._meta.db.run_querystring(explain)
+            plan = rows[0]["QUERY PLAN"]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            results[route] = _unindexed_scans(plan[0]["Plan"])
+    return results
@@ -25,6 +25,16 @@ class Event(Table, help_text="Represents an Event associated with a Person"):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
+    # 👇 Indexes spanning several columns; they're created by `create_db_indexes` in `api/db/indexes.py`
+    composite_indexes = [
+        # Keyset pagination for `GET /events`
+        ("datetime_created", "id"),
+        # `GET /events?keyword=`, `GET /events/stats?event_type=`
+        ("event_type", "datetime_created"),
+        # `GET /events?person_id=`, the newest Events of a Person, and the cascade when a Person is deleted
+        ("person_id", "datetime_created"),
+    ]
+
     # 💡 https://stackoverflow.com/questions/3768895/how-to-make-a-class-json-serializable
     def toJSON(self):
         return json.dumps(self, default=lambda o: o.__dict__, 
@@ -0,0 +1,33 @@
+from piccolo.columns import Column, Timestamp, UUID
+from piccolo.table import Table
+
+# With the exception of the 'id' column, table columns are organized alphabetically
+
+# Timestamps are prefaced with `datetime_` to visually and alphabetically 'chunk'
+# them together for easier reference
+
+class EventKey(Table, help_text="The id of an Event written by `POST /events`, unique on its own"):
+    """
+    The id of an Event written by `POST /events` (and its batch and write-behind paths) while `EVENT_PARTITIONING`
+    is true. A partitioned `event` table's primary key has to include `datetime_created`, so it can't turn away a
+    retry that reuses an Event id with a new `datetime_created`; this table's primary key is the id alone and does
+    that instead. Rows are written in the same statement (or transaction) as their Event and deleted with it.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+
+    id: Column = UUID(
+        helper_text="The id of the Event.",
+        null=False,
+        primary_key=True,
+        required=True,
+        unique=True
+    )
+
+    datetime_created: Column = Timestamp(
+        helper_text="The `datetime_created` of the Event, so that the keys of an expired Event partition can be removed with it.",
+        index=True,
+        null=False,
+        required=True
+    )
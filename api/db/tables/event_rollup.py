@@ -0,0 +1,67 @@
+from api.db.tables.event import EventType
+from enum import Enum
+from piccolo.columns import BigInt, Column, Timestamp, UUID, Varchar
+from piccolo.table import Table
+
+# With the exception of the 'id' column, table columns are organized alphabetically
+
+# Timestamps are prefaced with `datetime_` to visually and alphabetically 'chunk'
+# them together for easier reference
+
+class Bucket(Enum):
+    """
+    The sizes of the time buckets Events are counted in.
+    """
+    MINUTE = "minute"
+    HOUR = "hour"
+    DAY = "day"
+
+class EventRollup(Table, help_text="The number of Events of one type that occurred in one time bucket"):
+    """
+    The number of Events of one type that occurred in one (completed) time bucket. Rows are written by the
+    rollup scheduler in `api/services/rollups.py` and read by `GET /events/stats`.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+    # 👇 Like `composite_indexes` (see `api/db/indexes.py`), but unique: one row per bucket and event type
+    unique_composite_indexes = [
+        ("bucket", "datetime_bucket", "event_type"),
+    ]
+
+
+    id: Column = UUID(
+        helper_text="The id (primary key) of the rollup.",
+        null=False,
+        primary_key=True,
+        required=False,
+        unique=True
+    )
+
+    bucket: Column = Varchar(
+        choices=Bucket,
+        helper_text="The size of the time bucket. Valid options are: 'minute', 'hour', and 'day'.",
+        length=10,
+        null=False,
+        required=True
+    )
+
+    count: Column = BigInt(
+        default=0,
+        helper_text="The number of Events of `event_type` that occurred in the time bucket.",
+        null=False,
+        required=True
+    )
+
+    datetime_bucket: Column = Timestamp(
+        helper_text="The start of the time bucket.",
+        null=False,
+        required=True
+    )
+
+    event_type: Column = Varchar(
+        choices=EventType,
+        helper_text="The type of Event being counted.",
+        null=False,
+        required=True
+    )
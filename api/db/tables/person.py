@@ -26,6 +26,20 @@ class Person(Table, help_text="Represents a person that accesses the api (i.e.,
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
+    # 👇 Indexes spanning several columns; they're created by `create_db_indexes` in `api/db/indexes.py`
+    composite_indexes = [
+        # Keyset pagination for `GET /persons`
+        ("datetime_created", "id"),
+    ]
+
+    # 👇 Trigram (pg_trgm) indexes on the lowercased column, for case-insensitive prefix and substring matches
+    trigram_indexes = [
+        # Search for `GET /persons/search`
+        "email",
+        "first_name",
+        "last_name",
+    ]
+
 
     id: Column = UUID(
         helper_text="The id (primary key) of the Person.",
@@ -42,8 +56,8 @@ class Person(Table, help_text="Represents a person that accesses the api (i.e.,
     )
 
     datetime_modified: Column = Timestamp(
-        auto_update=datetime.now(),
-        helper_text="The datetime the Person was modified. This automatically sets to 'datetime.now()' whenever a Person is updated (as in a PUT request).",
+        auto_update=datetime.utcnow,
+        helper_text="The datetime the Person was modified. This automatically sets to 'datetime.utcnow()' whenever a Person is updated (as in a PUT request).",
         null=False,
         required=False
     )
@@ -0,0 +1,68 @@
+from api.db.tables.person import Person
+from piccolo.columns import Column, ForeignKey, Integer, Timestamp, UUID
+from piccolo.table import Table
+
+# With the exception of the 'id' column, table columns are organized alphabetically
+
+# Timestamps are prefaced with `datetime_` to visually and alphabetically 'chunk'
+# them together for easier reference
+
+class PersonEventSummary(Table, help_text="A running summary of the Events associated with a Person"):
+    """
+    A running summary of the Events associated with a Person: a count per `EventType`, and when the Person
+    was first and last seen. It is kept up to date in the same transaction as every Event insert and delete.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+
+    id: Column = UUID(
+        helper_text="The id (primary key) of the summary.",
+        null=False,
+        primary_key=True,
+        required=False,
+        unique=True
+    )
+
+    click_count: Column = Integer(
+        default=0,
+        helper_text="The number of 'click' Events associated with the Person.",
+        null=False,
+        required=False
+    )
+
+    datetime_first_seen: Column = Timestamp(
+        default=None,
+        helper_text="The datetime of the Person's oldest Event.",
+        null=True,
+        required=False
+    )
+
+    datetime_last_seen: Column = Timestamp(
+        default=None,
+        helper_text="The datetime of the Person's newest Event.",
+        null=True,
+        required=False
+    )
+
+    person_id: Column = ForeignKey(
+        helper_text="The id of the Person this summary describes.",
+        null=False,
+        required=True,
+        references=Person,
+        unique=True
+    )
+
+    signup_count: Column = Integer(
+        default=0,
+        helper_text="The number of 'signup' Events associated with the Person.",
+        null=False,
+        required=False
+    )
+
+    submitted_feedback_count: Column = Integer(
+        default=0,
+        helper_text="The number of 'submitted_feedback' Events associated with the Person.",
+        null=False,
+        required=False
+    )
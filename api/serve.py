@@ -0,0 +1,77 @@
+"""
+Runs the api for production: several worker processes (one per core by default), each with its own event loop and
+database pool, and no auto-reload. uvloop and httptools are used when they are installed. Start it with
+`python -m api.serve` (or `make start-api-prod`); `make start-api` is still the way to run a single reloading
+process while developing.
+"""
+from dotenv import load_dotenv
+from piccolo_conf import DB_POOL_MAX_SIZE, DB_POOL_MIN_SIZE
+import importlib.util
+import logging
+import os
+import uvicorn
+
+load_dotenv()
+
+# The interface and port the workers listen on
+API_HOST = os.environ.get("API_HOST", "0.0.0.0")
+API_PORT = int(os.environ.get("API_PORT", 8080))
+
+# The number of worker processes; defaults to one per core
+API_WORKERS = int(os.environ.get("API_WORKERS", os.cpu_count() or 1))
+
+# 👇 The most connections all workers may open together; leave room below Postgres' `max_connections` (100 by default) for migrations and admin tools
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", 90))
+
+logger = logging.getLogger("api")
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def size_worker_pools(workers: int):
+    """
+    Shrinks each worker's pool when `workers` pools of `DB_POOL_MAX_SIZE` connections would go over
+    `DB_MAX_CONNECTIONS`. The workers read the pool sizes from the environment, which they inherit from this process.
+    """
+    # 👇 With `EVENT_STREAM` (see `api/services/live.py`), each worker also holds one connection outside its pool to listen for new Events
+    listeners = workers if os.environ.get("EVENT_STREAM", "true").lower() == "true" else 0
+    available = DB_MAX_CONNECTIONS - listeners
+    max_size = min(DB_POOL_MAX_SIZE, max(1, available // workers))
+    if workers > available:
+        logger.warning(
+            f"{workers} workers need at least {workers + listeners} connections, more than `DB_MAX_CONNECTIONS` ({DB_MAX_CONNECTIONS}) allows."
+        )
+    elif max_size < DB_POOL_MAX_SIZE:
+        logger.warning(
+            f"Shrinking each worker's database pool to {max_size} connections so that {workers} workers stay within "
+            f"`DB_MAX_CONNECTIONS` ({DB_MAX_CONNECTIONS})."
+        )
+
+    os.environ["DB_POOL_MAX_SIZE"] = str(max_size)
+    os.environ["DB_POOL_MIN_SIZE"] = str(min(DB_POOL_MIN_SIZE, max_size))
+
+
+def main():
+    workers = max(1, API_WORKERS)
+    size_worker_pools(workers)
+    uvicorn.run(
+        "api.server:app",
+        host=API_HOST,
+        port=API_PORT,
+        workers=workers,
+        loop=event_loop(),
+        http=http_protocol(),
+        # 👇 Every request is already logged (with its route and timings) by the `log_requests` middleware
+        access_log=False,
+        log_level="info",
+    )
+
+
+if __name__ == "__main__":
+    main()
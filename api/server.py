@@ -5,18 +5,93 @@ from .models import (
     PersonDeleteModel,
     PersonPostModel,
 )
-from api.db.tables.event import Event, EventType
+from .services import (
+    BUCKET_SIZES,
+    EVENT_BATCH_MAX_SIZE,
+    EVENT_BUFFER_RETRY_AFTER,
+    EVENT_CACHE_TTL_SECONDS,
+    EVENT_ROLLUP_INTERVAL_SECONDS,
+    EVENT_STATS_DEFAULT_BUCKETS,
+    EVENT_STREAM,
+    EVENT_STREAM_RETRY_AFTER,
+    EVENT_TYPES,
+    EVENT_WRITE_BEHIND,
+    IDEMPOTENCY_KEY_TTL_SECONDS,
+    PERSON_CACHE_TTL_SECONDS,
+    PERSON_EVENTS_PROJECTION,
+    admit_requests,
+    after_cursor,
+    cache_key,
+    compress_responses,
+    create_event,
+    create_person,
+    event_validators,
+    event_version_select,
+    events_page_validators,
+    delete_event,
+    delete_person,
+    event_buffer,
+    event_hub,
+    event_stats,
+    idempotent_event_id,
+    idempotent_responses,
+    import_persons,
+    insert_event_batch,
+    log_requests,
+    logger,
+    decode_cursor,
+    has_conditions,
+    json_response,
+    not_modified,
+    page_limit,
+    paginate,
+    parse_event_batch,
+    person_search_select,
+    person_select,
+    person_validators,
+    person_version_select,
+    persons_page_validators,
+    read_node,
+    record_metrics,
+    render_metrics,
+    response_cache,
+    route_reads,
+    search_query,
+    run_rollup_scheduler,
+    serialize_response,
+    start_logging,
+    stop_compression,
+    stop_logging,
+    track_routes,
+    use_json_serializer,
+    stream_events,
+    stream_ndjson,
+    validate_event,
+    with_validators,
+)
+from api.db.indexes import create_db_indexes
+from api.db.notifications import create_event_notify_trigger, drop_event_notify_trigger
+from api.db.partitions import (
+    EVENT_PARTITIONING,
+    create_future_event_partitions,
+    create_partitioned_event_table,
+    event_table_kind,
+)
+from api.db.tables.event import Event
+from api.db.tables.event_key import EventKey
+from api.db.tables.event_rollup import EventRollup
 from api.db.tables.person import Person
-from blacksheep import Application, FromJSON, Response, bad_request, not_found, ok
+from api.db.tables.person_event_summary import PersonEventSummary
+from blacksheep import Application, Content, FromHeader, FromJSON, FromQuery, Request, Response, StreamedContent, bad_request, not_found, ok, status_code
 from blacksheep.exceptions import InternalServerError
 from blacksheep.server.openapi.v3 import OpenAPIHandler
 from datetime import datetime
 from dotenv import load_dotenv
-from piccolo.columns.combination import And, Or
 from piccolo.engine import engine_finder
 from piccolo.table import create_db_tables
 from openapidocs.v3 import Info
 from typing import Optional
+import asyncio
 import json
 import os
 import uuid
@@ -27,12 +102,31 @@ ENVIRONMENT = os.environ.get("ENVIRONMENT", "local")
 # 👇 For security reasons, we only want this variable to be true in a local environment
 SHOW_ERROR_DETAILS = os.environ.get("SHOW_ERROR_DETAILS", None)
 
+# 👇 Keyed by the variable's name (not its value, which is unset in e.g. CI), so importing the app never fails
 if ENVIRONMENT in ["local"]:
-    os.environ[SHOW_ERROR_DETAILS] = "true"
-    app = Application(show_error_details=SHOW_ERROR_DETAILS)
+    os.environ["SHOW_ERROR_DETAILS"] = "true"
+    app = Application(show_error_details=True)
 else:
-    os.environ[SHOW_ERROR_DETAILS] = "false"
-    app = Application(show_error_details=SHOW_ERROR_DETAILS)
+    os.environ["SHOW_ERROR_DETAILS"] = "false"
+    app = Application(show_error_details=False)
+
+# 👇 Every JSON response is encoded with the serializer picked by `JSON_SERIALIZER` (orjson by default)
+use_json_serializer()
+
+# 👇 Sets up the logging context of each request and logs one line per request
+app.middlewares.append(log_requests)
+
+# 👇 Records per-route latency and database time for `GET /metrics`
+app.middlewares.append(record_metrics)
+
+# 👇 Compresses large JSON and text responses; outside the admission gate, so compressing doesn't hold a slot
+app.middlewares.append(compress_responses)
+
+# 👇 Limits how many reads and writes are handled at once, and sheds (503) those that wait too long for a slot
+app.middlewares.append(admit_requests)
+
+# 👇 Keeps a client's reads on the primary (rather than the read replica) for a moment after it writes
+app.middlewares.append(route_reads)
 
 delete = app.router.delete
 get = app.router.get
@@ -58,36 +152,97 @@ def crash_test():
 # -------------------------------------------------------------------------------------------
 
 @get("/persons")
-async def persons() -> Response:
+async def persons(request: Request, limit: Optional[int], cursor: Optional[str]) -> Response:
     """
-    Gets a list of all Persons. Note that if *no* Person items are present in the database, an empty array is returned *successfully*.
+    Gets a page of Persons (oldest first). Pass the `next_cursor` from a response as `cursor` to get the next page; `next_cursor` is null on the last page.
+    Note that if *no* Person items are present in the database, an empty array is returned *successfully*.
+    Send the `ETag` of a previous response as `If-None-Match` to get a 304 (without a body) if the page hasn't changed.
     """
     try:
-        print(f"\nGetting a list of all Persons...")
-        persons = await Person.select()
+        page_size = page_limit(limit)
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError as e:
+        return bad_request(message=custom_response(data=None, details=bad_request_message(ex=e), message="Bad Request", status_code=400))
+
+    try:
+        # 👇 A revalidation reads the same page, but only the columns its validators depend on
+        if has_conditions(request):
+            versions, next_cursor = await paginate(person_version_select(), Person, limit=page_size, cursor=cursor, node=read_node())
+            response = not_modified(request, persons_page_validators(versions, next_cursor, cursor, page_size))
+            if response is not None:
+                return response
+
+        logger.debug("Getting a page of Persons")
+        persons, next_cursor = await paginate(person_select(), Person, limit=page_size, cursor=cursor, node=read_node())
         if not persons:
             # 💡 This 'successfully returned no data in array' situation might be really annoying for UI development,
             # especially if array operations are involved. It might be easier to throw an error instead.
-            return ok(message=custom_response(data=persons, details="The request was successful, however, there are no items in the database to retrieve.", message="Ok", status_code=200))
+            return ok(message=custom_response(data=persons, details="The request was successful, however, there are no items in the database to retrieve.", message="Ok", status_code=200, next_cursor=next_cursor))
         
         # 👇 Ensures the events are returned as 'pretty' json rather than a string jsonb
         for p in persons:
             decoded_events = json.JSONDecoder().decode(p['events'])
             p['events'] = decoded_events
 
-        return ok(message=custom_response(data=persons, details=successful_message(), message="Ok", status_code=200))
+        validators = persons_page_validators(persons, next_cursor, cursor, page_size)
+        return with_validators(ok(message=custom_response(data=persons, details=successful_message(), message="Ok", status_code=200, next_cursor=next_cursor)), validators)
     except Exception as e:
-        return not_found(message=custom_response(data=persons, details=not_found_message('Person', ex=e), message="Not Found", status_code=404))
+        return not_found(message=custom_response(data=None, details=not_found_message('Person', ex=e), message="Not Found", status_code=404))
+
+
+@get("/persons/search")
+async def persons_search(q: Optional[str], limit: Optional[int], cursor: Optional[str]) -> Response:
+    """
+    Finds Persons whose email, first name, or last name contains `q` (ignoring case), a page at a time (oldest first). A `q` of one or two
+    characters matches only the start of them. Pass the `next_cursor` from a response as `cursor` (with the same `q`) to get the next page.
+    """
+    try:
+        search_query(q)
+        page_size = page_limit(limit)
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError as e:
+        return bad_request(message=custom_response(data=None, details=bad_request_message(ex=e), message="Bad Request", status_code=400))
+
+    try:
+        logger.debug("Searching Persons")
+        # 👇 Each searched column finds its own page of matches (through its trigram index when they are few)
+        persons, next_cursor = await paginate(person_search_select(q, page_size, cursor), Person, limit=page_size, cursor=cursor, node=read_node())
+        if not persons:
+            return ok(message=custom_response(data=persons, details="The request was successful, however, no Persons match the search.", message="Ok", status_code=200, next_cursor=next_cursor))
+
+        # 👇 Ensures the events are returned as 'pretty' json rather than a string jsonb
+        for p in persons:
+            p['events'] = json.JSONDecoder().decode(p['events'])
+
+        return ok(message=custom_response(data=persons, details=successful_message(), message="Ok", status_code=200, next_cursor=next_cursor))
+    except Exception as e:
+        return not_found(message=custom_response(data=None, details=not_found_message('Person', ex=e), message="Not Found", status_code=404))
 
 
 @get("/persons/{id}")
-async def persons(id: str) -> Response:
+async def persons(request: Request, id: str) -> Response:
     """
-    Gets a Person by its id.
+    Gets a Person by its id. Send the `ETag` of a previous response as `If-None-Match` to get a 304 (without a body) if it hasn't changed.
     """
     try:
-        print(f"\nGetting Person by id {id}...")
-        person = await Person.select().where(id==Person.id).first()
+        # 👇 A cached response is served as-is, skipping both the query and the serialization
+        key = cache_key("person", id)
+        cached = response_cache.get(key)
+        if cached is not None:
+            body, validators = cached
+            return not_modified(request, validators) or with_validators(json_response(body, reusable=True), validators)
+
+        # 👇 A revalidation only reads when the Person was modified (and, with the projection, which Events it shows)
+        if has_conditions(request):
+            version = await person_version_select().where(id==Person.id).first().run(node=read_node())
+            response = not_modified(request, person_validators(version)) if version else None
+            if response is not None:
+                return response
+
+        logger.debug("Getting Person by id", extra={"entity_id": id})
+        person = await person_select().where(id==Person.id).first().run(node=read_node())
 
         if not person:
             return not_found(message=custom_response(data=person, details=not_found_by_id_message(ent='Person', id=id), message="Not Found", status_code=404))
@@ -96,7 +251,10 @@ async def persons(id: str) -> Response:
         decoded_events = json.JSONDecoder().decode(person['events'])
         person['events'] = decoded_events
 
-        return ok(message=custom_response(data=person, details=successful_message(), message="Ok", status_code=200))
+        validators = person_validators(person)
+        body = serialize_response(custom_response(data=person, details=successful_message(), message="Ok", status_code=200))
+        response_cache.set(key, (body, validators), ttl=PERSON_CACHE_TTL_SECONDS)
+        return with_validators(json_response(body, reusable=response_cache.enabled), validators)
     except Exception as e:
         return bad_request(message=custom_response(data=person, details=bad_request_message(ex=e), message="Bad Request", status_code=400))
 
@@ -107,7 +265,7 @@ async def persons(req: FromJSON[PersonPostModel]) -> Response:
     Creates a new Person.
     """
     try:
-        print("\nCreating new Person...")
+        logger.debug("Creating new Person")
         #TODO HN 10/9/23: Add request validation; Currently, no error is thrown if a request is sent with an `id` or `datetime_modified`. They are simply ignored in the request and values are set below instead. I'd rather tell the api user their request is invalid than quietly ignore it. Additionally, `role` can have any string value, not just one from the enum.
         person = Person(**req.value.dict())
 
@@ -119,38 +277,61 @@ async def persons(req: FromJSON[PersonPostModel]) -> Response:
             # Set modified to the same value as created
             person.datetime_modified = person.datetime_created
 
-        person.events = []
+        # 👇 The Person, its 'signup' Event, and its Event summary are created atomically in one round trip
+        logger.debug("Creating Person with its signup Event", extra={"entity_id": person.id, "role": person.role})
+        created_person = await create_person(person)
 
-        await person.save().run()
-        created_person = await Person.select().where(person.id==Person.id).first()
-        
-        if not created_person:
-            return not_found(message=custom_response(data=person, details=not_found_by_id_message(ent='Person', id=person.id), message="Not Found", status_code=404))
-
-        # TODO: Move to a service layer
-        # 👇 Logic to add 'signup' event to newly-created Person
-        print(f"\nCreating signup Event for Person with id {person.id} and role {person.role}...")
-
-        signup_event = Event(
-            id = uuid.uuid4(),
-            datetime_created = datetime.utcnow(),
-            event_type = EventType.SIGNUP,
-            person_id = person.id
-        )
+        return ok(message=custom_response(data=created_person, details=successful_message(), message="Ok", status_code=201))
+    except Exception as e:
+        return bad_request(message=custom_response(data=None, details=not_created_message(ent='Person', ex=e), message="Bad Request", status_code=400))
 
-        # 👇 Save event to database before linking to person
-        await signup_event.save().run()
-        created_signup_event = await Event.select(Event.all_columns(), Event.all_related()).where(signup_event.id==Event.id).run()
 
-        created_person['events'] = created_signup_event
-        # 👇 We don't want created & modified dates to be out of sync for POST; so use_auto_update=False
-        await Person.update(created_person, use_auto_update=False).where(person.id==Person.id).run()
+@post("/persons/import")
+async def persons_import(request: Request, format: Optional[str]) -> Response:
+    """
+    Creates many Persons (each with its 'signup' Event) from an upload that is read as it streams in: CSV with a header line
+    (`Content-Type: text/csv`) or NDJSON, one Person per line (`Content-Type: application/x-ndjson`); `?format=csv|ndjson` overrides
+    the content type. Rows are validated like `POST /persons` and written in chunks. The report counts the rows received, created,
+    and rejected, and gives the row number and reason of each rejection.
+    """
+    ndjson = format == "ndjson" if format else request.declares_content_type(b"application/x-ndjson")
+    if not ndjson and not (format == "csv" or request.declares_content_type(b"text/csv")):
+        return bad_request(message=custom_response(data=None, details=bad_request_message(ex="Send the upload as `text/csv` or `application/x-ndjson`."), message="Bad Request", status_code=400))
 
-        return ok(message=custom_response(data=created_person, details=successful_message(), message="Ok", status_code=201))
+    try:
+        logger.debug("Importing Persons", extra={"format": "ndjson" if ndjson else "csv"})
+        report = await import_persons(request.stream(), ndjson=ndjson)
+
+        if not report["created"]:
+            return bad_request(message=custom_response(data=report, details=not_created_message(ent='Person', ex=report["aborted"] or "None of the rows were valid."), message="Bad Request", status_code=400))
+
+        return ok(message=custom_response(data=report, details=successful_message(), message="Ok", status_code=201))
     except Exception as e:
         return bad_request(message=custom_response(data=None, details=not_created_message(ent='Person', ex=e), message="Bad Request", status_code=400))
 
 
+@get("/persons/{id}/summary")
+async def persons(id: str) -> Response:
+    """
+    Gets the Event summary of a Person: a count per event type, and when the Person was first and last seen.
+    """
+    try:
+        logger.debug("Getting the Event summary of Person", extra={"entity_id": id})
+        summary = await PersonEventSummary.select().where(id==PersonEventSummary.person_id).first().run(node=read_node())
+
+        if not summary:
+            # 👇 Only a Person with no Events has no summary yet; anyone else is unknown
+            person = await Person.select(Person.id).where(id==Person.id).first().run(node=read_node())
+            if not person:
+                return not_found(message=custom_response(data=None, details=not_found_by_id_message(ent='Person', id=id), message="Not Found", status_code=404))
+            summary = PersonEventSummary(person_id=person['id']).to_dict()
+            summary['id'] = None
+
+        return ok(message=custom_response(data=summary, details=successful_message(), message="Ok", status_code=200))
+    except Exception as e:
+        return bad_request(message=custom_response(data=None, details=bad_request_message(ex=e), message="Bad Request", status_code=400))
+
+
 # TODO HN 10/8/23: Maybe there should be a separate PUT and PATCH request for different tasks here.
 # Instead of a PUT which can take all Person attrs and Events, maybe this should just handle the 
 # Person and a separate PATCH route should be created specifically for linking events to a person.
@@ -167,7 +348,7 @@ async def persons(id: str, req: FromJSON) -> Response:
     Updates an existing Person with the data from the request
     """
     try:
-        print(f"\nEditing Person with id {id}...")
+        logger.debug("Editing Person", extra={"entity_id": id})
 
         # TODO: HN 10/8/23: Find a more elegant solution for the the request structure. 
         # Currently, someone using the api can copy-🍝 "data: {" ... "}" into the request
@@ -185,10 +366,14 @@ async def persons(id: str, req: FromJSON) -> Response:
 
         # custom_print('json.dumps(req_as_json[events])', json.dumps(req_as_json['events']))
         # custom_print('req_as_json[events]', req_as_json['events'])
-        events = req_as_json['events']
-        # custom_print('events', events)
-        encoded_events = json.JSONEncoder().encode(events)
-        req_as_json['events'] = encoded_events
+        if PERSON_EVENTS_PROJECTION:
+            # 👇 Events are read from the `event` table, so the JSONB copy is left alone
+            req_as_json.pop('events', None)
+        else:
+            events = req_as_json['events']
+            # custom_print('events', events)
+            encoded_events = json.JSONEncoder().encode(events)
+            req_as_json['events'] = encoded_events
         # custom_print('req_as_json', req_as_json)
 
 
@@ -198,9 +383,10 @@ async def persons(id: str, req: FromJSON) -> Response:
         # must be re-added to a PUT, being careful not to overwrite the data you just edited!
         # Maybe a PATCH is better here.)
         await Person.update(req_as_json).where(id==Person.id).run()
+        response_cache.invalidate(cache_key("person", id))
 
-        print(f"\nGetting Person by id {id}...")
-        edited_person = await Person.select().where(id==Person.id).first()
+        logger.debug("Getting Person by id", extra={"entity_id": id})
+        edited_person = await person_select().where(id==Person.id).first()
 
         # 👇 Ensures the events are returned as 'pretty' json rather than a string jsonb
         decoded_events = json.JSONDecoder().decode(edited_person['events'])
@@ -229,94 +415,231 @@ async def persons(id: str, req: FromJSON[PersonDeleteModel]) -> Response:
         if id != str(request_id):
             return bad_request(message=custom_response(data=None, details=route_request_mismatch_message(id=id, request_id=request_id), message="Bad Request", status_code=400))
         
-        print(f"\nGetting Person by id {id}...")
-        person = await Person.select().where(id==Person.id).first()
+        logger.debug("Deleting Person", extra={"entity_id": id})
+        # 👇 One statement: whether the Person existed decides the 404
+        deleted = await delete_person(id)
 
-        if not person:
-            return not_found(message=custom_response(data=person, details=not_found_by_id_message(ent='Person', id=id), message="Not Found", status_code=404))
+        if not deleted:
+            return not_found(message=custom_response(data=None, details=not_found_by_id_message(ent='Person', id=id), message="Not Found", status_code=404))
 
-        print(f"\nDeleting Person with id {id}...")
-        await Person.delete().where(id==Person.id).run()
+        # 👇 The Person's cached Events go too, since deleting a Person deletes its Events
+        response_cache.invalidate(cache_key("person", id))
         return ok(message=custom_response(data=None, details=successful_message(), message="Ok", status_code=200))
 
     except Exception as e:
-        return bad_request(message=custom_response(data=person, details=f"{route_request_mismatch_message(id=id, request_id=request_id)} Details: {e}", message="Bad Request", status_code=400))
+        return bad_request(message=custom_response(data=None, details=f"{route_request_mismatch_message(id=id, request_id=request_id)} Details: {e}", message="Bad Request", status_code=400))
 
 # -------------------------------------------------------------------------------------------
 
 @get("/events")
-async def events(keyword: Optional[str], person_id: Optional[str]) -> Response:
+async def events(request: Request, keyword: Optional[str], person_id: Optional[str], limit: Optional[int], cursor: Optional[str], format: Optional[str]) -> Response:
     """
-    Gets a list of all Events
+    Gets a page of Events (oldest first), optionally filtered by `keyword` (the event type) and/or `person_id`. Pass the `next_cursor` from
+    a response as `cursor` to get the next page; `next_cursor` is null on the last page.
+
+    With `?format=ndjson` (or `Accept: application/x-ndjson`) every matching Event is streamed instead, one JSON object per line, and `limit` is ignored.
+    Send the `ETag` of a previous page as `If-None-Match` to get a 304 (without a body) if the page hasn't changed.
     """
+    try:
+        page_size = page_limit(limit)
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError as e:
+        return bad_request(message=custom_response(data=None, details=bad_request_message(ex=e), message="Bad Request", status_code=400))
 
     try:
-        print(f"\nGetting a list of all Events...")
-
-        # TODO: HN 10/7/23: if/else and exception madness. 
-        if keyword and person_id:
-            events_search = await Event.select().where(And(keyword == Event.event_type, person_id == Event.person_id)).run()
-            if not events_search:
-                # 💡 This 'successfully returned no data in array' situation might be really annoying for UI development
-                return ok(message=custom_response(data=events_search, details="The request was successful, however, there are no items in the database to retrieve.", message="Ok", status_code=200))
-            return ok(message=custom_response(data=events_search, details=successful_message(), message="Ok", status_code=200))
-
-        if keyword or person_id:
-            events_search = await Event.select().where(Or(keyword == Event.event_type, person_id == Event.person_id)).run()
-            if not events_search:
-                # 💡 This 'successfully returned no data in array' situation might be really annoying for UI development
-                return ok(message=custom_response(data=events_search, details="The request was successful, however, there are no items in the database to retrieve.", message="Ok", status_code=200))
-            return ok(message=custom_response(data=events_search, details=successful_message(), message="Ok", status_code=200))
-
-        events = await Event.select(Event.all_columns())
+        logger.debug("Getting a page of Events")
+
+        query = Event.select(Event.all_columns())
+        version_query = event_version_select()
+        if keyword:
+            query = query.where(keyword == Event.event_type)
+            version_query = version_query.where(keyword == Event.event_type)
+        if person_id:
+            query = query.where(person_id == Event.person_id)
+            version_query = version_query.where(person_id == Event.person_id)
+
+        # 👇 Exports stream straight from a server-side cursor instead of building one giant response
+        if format == "ndjson" or b"application/x-ndjson" in (request.get_first_header(b"Accept") or b""):
+            ndjson_query = after_cursor(query, Event, cursor)
+            # 👇 Picked now; the stream is written after the handler (and the request's routing context) has returned
+            node = read_node()
+
+            async def provider():
+                try:
+                    async for chunk in stream_ndjson(ndjson_query, node=node):
+                        yield chunk
+                except Exception as e:
+                    # The status line has already been sent, so the client sees a truncated stream
+                    logger.error("Unable to finish streaming Events", exc_info=e)
+
+            return Response(200, content=StreamedContent(b"application/x-ndjson", provider))
+
+        # 👇 A revalidation reads the same page, but only the Events' ids and creation times (which the indexes cover)
+        filters = (keyword, person_id)
+        if has_conditions(request):
+            versions, next_cursor = await paginate(version_query, Event, limit=page_size, cursor=cursor, node=read_node())
+            response = not_modified(request, events_page_validators(versions, next_cursor, cursor, page_size, filters))
+            if response is not None:
+                return response
+
+        events, next_cursor = await paginate(query, Event, limit=page_size, cursor=cursor, node=read_node())
         if not events:
             # 💡 This 'successfully returned no data in array' situation might be really annoying for UI development
-            return ok(message=custom_response(data=events, details="The request was successful, however, there are no items in the database to retrieve.", message="Ok", status_code=200))
-        return ok(message=custom_response(data=events, details=successful_message(), message="Ok", status_code=200))
+            return ok(message=custom_response(data=events, details="The request was successful, however, there are no items in the database to retrieve.", message="Ok", status_code=200, next_cursor=next_cursor))
+        validators = events_page_validators(events, next_cursor, cursor, page_size, filters)
+        return with_validators(ok(message=custom_response(data=events, details=successful_message(), message="Ok", status_code=200, next_cursor=next_cursor)), validators)
 
     except Exception as e:
         return not_found(message=custom_response(data=None, details=not_found_message(ent='Event', ex=e), message="Not Found", status_code=404))    
 
 
+# 👇 `from` is a Python keyword, so these bind the `from` and `to` query parameters by name
+class StatsFrom(FromQuery[Optional[datetime]]):
+    name = "from"
+
+class StatsTo(FromQuery[Optional[datetime]]):
+    name = "to"
+
+
+@get("/events/stats")
+async def events(bucket: Optional[str], from_: StatsFrom, to: StatsTo, event_type: Optional[str], person_id: Optional[str]) -> Response:
+    """
+    Gets the number of Events per time bucket (`bucket` is 'minute', 'hour' (the default), or 'day'), oldest first, optionally filtered by
+    `event_type` and/or `person_id`. Every bucket containing a moment between `from` and `to` is returned; `to` defaults to now and `from`
+    defaults to 60 buckets before `to`.
+    """
+    bucket = bucket or "hour"
+    try:
+        logger.debug("Getting Event stats", extra={"bucket": bucket})
+        end = to.value or datetime.utcnow()
+        start = from_.value or (end - BUCKET_SIZES.get(bucket, BUCKET_SIZES["hour"]) * (EVENT_STATS_DEFAULT_BUCKETS - 1))
+        stats = await event_stats(bucket, start, end, event_type=event_type, person_id=person_id, node=read_node())
+    except ValueError as e:
+        return bad_request(message=custom_response(data=None, details=bad_request_message(ex=e), message="Bad Request", status_code=400))
+    except Exception as e:
+        return not_found(message=custom_response(data=None, details=not_found_message(ent='Event', ex=e), message="Not Found", status_code=404))
+
+    return ok(message=custom_response(data=stats, details=successful_message(), message="Ok", status_code=200))
+
+
+@get("/events/stream")
+async def events_stream(request: Request, event_type: Optional[str], person_id: Optional[str]) -> Response:
+    """
+    Streams every Event created from now on as Server-Sent Events (`text/event-stream`), optionally filtered by `event_type` and/or
+    `person_id`. Each Event is sent as an `event` message whose `data` is the Event as JSON. Events created while a client is
+    disconnected are not replayed; fetch them from `GET /events`.
+    """
+    try:
+        if event_type is not None and event_type not in EVENT_TYPES:
+            raise ValueError(f"`event_type` must be one of {EVENT_TYPES}.")
+        if person_id is not None:
+            person_id = str(uuid.UUID(person_id))
+    except ValueError as e:
+        return bad_request(message=custom_response(data=None, details=bad_request_message(ex=e), message="Bad Request", status_code=400))
+
+    subscriber = event_hub.subscribe(event_type=event_type, person_id=person_id) if event_hub.running else None
+    if subscriber is None:
+        response = status_code(503, custom_response(data=None, details=service_unavailable_message(retry_after=EVENT_STREAM_RETRY_AFTER), message="Service Unavailable", status_code=503))
+        response.add_header(b"Retry-After", str(EVENT_STREAM_RETRY_AFTER).encode())
+        return response
+
+    logger.debug("Streaming new Events", extra={"event_type": event_type, "entity_id": person_id})
+
+    async def provider():
+        async for frame in stream_events(request, subscriber):
+            yield frame
+
+    # 👇 `X-Accel-Buffering` stops nginx from holding frames back until its buffer fills
+    return Response(200, [(b"Cache-Control", b"no-cache"), (b"X-Accel-Buffering", b"no")], StreamedContent(b"text/event-stream", provider))
+
+
 @get("/events/{id}")
-async def events(id: str) -> Response:
+async def events(request: Request, id: str) -> Response:
     """
-    Gets an Event by its id.
+    Gets an Event by its id. Send the `ETag` of a previous response as `If-None-Match` to get a 304 (without a body) if it hasn't changed.
     """
     try:
-        print(f"\nGetting Event by id {id}...")
-        event = await Event.select().where(id==Event.id).first()
+        # 👇 A cached response is served as-is, skipping both the query and the serialization
+        key = cache_key("event", id)
+        cached = response_cache.get(key)
+        if cached is not None:
+            body, validators = cached
+            return not_modified(request, validators) or with_validators(json_response(body, reusable=True), validators)
+
+        # 👇 A revalidation only needs the Event's id and creation time to be answered
+        if has_conditions(request):
+            version = await event_version_select().where(id==Event.id).first().run(node=read_node())
+            response = not_modified(request, event_validators(version)) if version else None
+            if response is not None:
+                return response
+
+        logger.debug("Getting Event by id", extra={"entity_id": id})
+        event = await Event.select().where(id==Event.id).first().run(node=read_node())
 
         if not event:
             return not_found(message=custom_response(data=event, details=not_found_by_id_message(ent='Event', id=id), message="Not Found", status_code=404))
         
-        return ok(message=custom_response(data=event, details=successful_message(), message="Ok", status_code=200))
+        validators = event_validators(event)
+        body = serialize_response(custom_response(data=event, details=successful_message(), message="Ok", status_code=200))
+        # 👇 Tagged with its Person, so that deleting the Person drops it as well
+        response_cache.set(key, (body, validators), ttl=EVENT_CACHE_TTL_SECONDS, tags=[cache_key("person", event['person_id'])])
+        return with_validators(json_response(body, reusable=response_cache.enabled), validators)
     except Exception as e:
         return bad_request(message=custom_response(data=event, details=bad_request_message(ex=e), message="Bad Request", status_code=400))
 
 
+# 👇 Binds the `Idempotency-Key` header by name
+class IdempotencyKey(FromHeader[Optional[str]]):
+    name = "Idempotency-Key"
+
+
 @post("/events")
-async def events(req: FromJSON[EventPostModel]) -> Response:
+async def events(req: FromJSON[EventPostModel], idempotency_key: IdempotencyKey) -> Response:
     """
     Creates a new Event.
+
+    Send an `Idempotency-Key` header (or an `id`) to make retries safe: a retry of a request that already created an Event gets
+    the original response back, and no second Event is created.
     """
 
     try:
-        print("\nCreating new Event...")
+        logger.debug("Creating new Event")
         event = Event(**req.value.dict())
 
+        # 👇 A client-chosen id (sent, or derived from the key) is the same on every retry; a generated one never repeats
+        if event.id is None:
+            event.id = idempotent_event_id(idempotency_key.value, event.person_id)
+        replay_key = f"{event.person_id}:{event.id}" if event.id else None
+
+        # 👇 A retry this worker has already answered is answered again from memory, without touching the database
+        replayed = idempotent_responses.get(replay_key)
+        if replayed is not None:
+            logger.debug("Replaying the response to an earlier request", extra={"entity_id": replay_key})
+            return json_response(replayed, status=202 if EVENT_WRITE_BEHIND else 200)
+
+        # 👇 In write-behind mode the Event is only validated here; the buffer saves it in bulk shortly afterwards
+        if EVENT_WRITE_BEHIND:
+            try:
+                buffered_event = validate_event({**req.value.dict(), "id": event.id})
+            except ValueError as e:
+                return bad_request(message=custom_response(data=None, details=not_created_message(ent='Event', ex=e), message="Bad Request", status_code=400))
+
+            if not event_buffer.offer(buffered_event):
+                response = status_code(503, custom_response(data=None, details=service_unavailable_message(retry_after=EVENT_BUFFER_RETRY_AFTER), message="Service Unavailable", status_code=503))
+                response.add_header(b"Retry-After", str(EVENT_BUFFER_RETRY_AFTER).encode())
+                return response
+
+            body = serialize_response(custom_response(data=buffered_event, details=accepted_message(), message="Accepted", status_code=202))
+            idempotent_responses.set(replay_key, body, ttl=IDEMPOTENCY_KEY_TTL_SECONDS)
+            return json_response(body, status=202)
+
         if event.id is None:
             event.id = uuid.uuid4()
 
         if event.datetime_created is None:
             event.datetime_created = datetime.utcnow()
 
-        # 👇 Check that the person_id in the request actually exists on a person before trying to attach an event to it
-        print(f"\Confirming that a Person with id {event.person_id} exists...")
-        person = await Person.select().where(event.person_id==Person.id).first().output(load_json=True)
-        if not person:
-            return not_found(message=custom_response(data=person, details=not_found_by_id_message(ent='Person', id=event.id), message="Not Found", status_code=404))
-        
         # TODO
         # 👇 Check event_type and confirm that if the requested event_type is 'signup', this type doesn't already exist for the person ('signup' should only be stored once for a Person)
         # person_with_signup_event = await Person.select(Event.event_type.arrow("signup")).where(event.person_id==Person.id).first().output(load_json=True)
@@ -332,15 +655,72 @@ async def events(req: FromJSON[EventPostModel]) -> Response:
             person_id=req.value.dict()['person_id']
         )
 
-        await serializable_event.save().run()
-
-        created_event = await Event.select().where(event.id==Event.id).first()
+        # 👇 One INSERT ... RETURNING; the foreign key (rather than a lookup beforehand) confirms that the Person exists, and
+        # the primary key (of `event_key`, with `EVENT_PARTITIONING`) turns away a retry this worker hasn't seen (it gets the existing Event back)
+        created_event = await create_event(serializable_event.to_dict())
         if not created_event:
-            return not_found(message=custom_response(data=serializable_event, details=not_found_by_id_message(ent='Event', id=event.id), message="Not Found", status_code=404))
+            return not_found(message=custom_response(data=None, details=not_found_by_id_message(ent='Person', id=event.person_id), message="Not Found", status_code=404))
 
-        return ok(message=custom_response(data=created_event, details=successful_message(), message="Ok", status_code=201))
+        body = serialize_response(custom_response(data=created_event, details=successful_message(), message="Ok", status_code=201))
+        idempotent_responses.set(replay_key, body, ttl=IDEMPOTENCY_KEY_TTL_SECONDS)
+        return json_response(body)
     except Exception as e:
-        return bad_request(message=custom_response(data=event, details=not_created_message(ent='Event', ex=e), message="Bad Request", status_code=400))
+        return bad_request(message=custom_response(data=None, details=not_created_message(ent='Event', ex=e), message="Bad Request", status_code=400))
+
+
+@post("/events/batch")
+async def events(request: Request) -> Response:
+    """
+    Creates many Events at once. The body is either a JSON array of Events or NDJSON (one Event per line, sent with
+    `Content-Type: application/x-ndjson`). Each item is reported back as either 'created' or 'rejected' with a reason.
+    """
+
+    try:
+        logger.debug("Creating a batch of Events")
+        body = await request.read()
+        items = parse_event_batch(body or b"", ndjson=request.declares_content_type(b"application/x-ndjson"))
+
+        if len(items) > EVENT_BATCH_MAX_SIZE:
+            return bad_request(message=custom_response(data=None, details=bad_request_message(ex=f"A batch may contain at most {EVENT_BATCH_MAX_SIZE} Events."), message="Bad Request", status_code=400))
+
+        results = await insert_event_batch(items)
+        created = sum(1 for r in results if r["status"] == "created")
+        summary = {"created": created, "rejected": len(results) - created, "results": results}
+
+        if not created:
+            return bad_request(message=custom_response(data=summary, details=not_created_message(ent='Event', ex="None of the Events in the batch were valid."), message="Bad Request", status_code=400))
+
+        return ok(message=custom_response(data=summary, details=successful_message(), message="Ok", status_code=201))
+    except Exception as e:
+        return bad_request(message=custom_response(data=None, details=not_created_message(ent='Event', ex=e), message="Bad Request", status_code=400))
+
+
+@docs(ignored=True)
+@get("/events/buffer")
+def events_buffer() -> Response:
+    """
+    Gets the counters of the write-behind Event buffer (queue depth, overflows, and flush latency).
+    """
+    return ok(message=custom_response(data=event_buffer.stats(), details=successful_message(), message="Ok", status_code=200))
+
+
+@docs(ignored=True)
+@get("/cache")
+def cache() -> Response:
+    """
+    Gets the counters of the response cache (hits, misses, evictions, and expirations).
+    """
+    return ok(message=custom_response(data=response_cache.stats(), details=successful_message(), message="Ok", status_code=200))
+
+
+@docs(ignored=True)
+@get("/metrics")
+def metrics() -> Response:
+    """
+    Gets the request latency histograms, the in-flight requests, and the database pool gauges of this worker in the
+    Prometheus text format.
+    """
+    return Response(200, None, Content(b"text/plain; version=0.0.4; charset=utf-8", render_metrics().encode("utf8")))
 
 
 @delete("/events/{id}")
@@ -355,41 +735,135 @@ async def events(id: str, req: FromJSON[EventDeleteModel]) -> Response:
         if id != str(request_id):
             return bad_request(message=custom_response(data=None, details=route_request_mismatch_message(id=id, request_id=request_id), message="Bad Request", status_code=400))
         
-        print(f"\nGetting Event by id {id}...")
-        event = await Event.select().where(id==Event.id).first()
+        logger.debug("Deleting Event", extra={"entity_id": id})
+        # 👇 One DELETE ... RETURNING; whether a row comes back decides the 404
+        event = await delete_event(id)
 
         if not event:
-            return not_found(message=custom_response(data=event, details=not_found_by_id_message(ent='Event', id=id), message="Not Found", status_code=404))
+            return not_found(message=custom_response(data=None, details=not_found_by_id_message(ent='Event', id=id), message="Not Found", status_code=404))
 
-        print(f"\nDeleting Event with id {id}...")
-        await Event.delete().where(id==Event.id).run()
+        response_cache.invalidate(cache_key("event", id), cache_key("person", event['person_id']))
         return ok(message=custom_response(data=None, details=successful_message(), message="Ok", status_code=200))
 
     except Exception as e:
-        return bad_request(message=custom_response(data=event, details=f"{route_request_mismatch_message(id=id, request_id=request_id)} Details: {e}", message="Bad Request", status_code=400))
+        return bad_request(message=custom_response(data=None, details=f"{route_request_mismatch_message(id=id, request_id=request_id)} Details: {e}", message="Bad Request", status_code=400))
 
 # -------------------------------------------------------------------------------------------
 
 # TODO: Either move db session code to another file or move routes (above) to a separate file
 async def open_database_connection_pool(application):
-    print("Opening database connection pool...")
+    logger.info("Opening database connection pool")
     try:
         # TODO: Tables need to be created (if they don't exist) prior to executing transactions; handle this here?
         engine = engine_finder()
         await engine.start_connection_pool()
-        await create_db_tables(Person, Event, if_not_exists=True)
+        # 👇 Opens (and checks) the pool's minimum number of connections now rather than during the first requests
+        await engine.warm_up_pool()
+        for node in engine.extra_nodes.values():
+            await node.start_connection_pool()
+            await node.warm_up_pool()
     except Exception as e:
-        print(f"Unable to connect to the database. Details: \n{e}")
+        logger.error("Unable to connect to the database", exc_info=e)
+        return
+
+    try:
+        if EVENT_PARTITIONING:
+            # 👇 `create_db_tables` can't partition a table, so `event` is created first (after the `person` table it references)
+            await create_db_tables(Person, EventKey, if_not_exists=True)
+            event_table = await event_table_kind()
+            if event_table is None:
+                await create_partitioned_event_table()
+            elif event_table == "table":
+                logger.warning("The `event` table isn't partitioned yet. Run `piccolo db partition_events` to convert it.")
+        await create_db_tables(Person, Event, EventRollup, PersonEventSummary, if_not_exists=True)
+        await create_db_indexes()
+        if EVENT_STREAM:
+            await create_event_notify_trigger()
+        else:
+            await drop_event_notify_trigger()
+    except Exception as e:
+        logger.error("Unable to create the database tables, indexes, and triggers", exc_info=e)
+
+    # 👇 Kept apart from the steps above, so that a failure here can't keep the tables, indexes, or triggers from being created
+    if EVENT_PARTITIONING:
+        try:
+            if await event_table_kind() == "partitioned":
+                await create_future_event_partitions()
+        except Exception as e:
+            logger.error("Unable to create the upcoming Event partitions", exc_info=e)
 
 
 async def close_database_connection_pool(application):
-    print("\nClosing database connection pool...")
+    logger.info("Closing database connection pool")
     try:
         engine = engine_finder()
         await engine.close_connection_pool()
+        for node in engine.extra_nodes.values():
+            await node.close_connection_pool()
     except Exception as e:
-        print(f"Unable to close connection to the database. Details: \n{e}")
+        logger.error("Unable to close connection to the database", exc_info=e)
+
+
+async def start_event_buffer(application):
+    if EVENT_WRITE_BEHIND:
+        logger.info("Starting write-behind Event buffer")
+        await event_buffer.start()
+
+
+async def stop_event_buffer(application):
+    if event_buffer.running:
+        logger.info("Draining write-behind Event buffer")
+        await event_buffer.stop()
+
+
+async def start_event_hub(application):
+    if EVENT_STREAM:
+        logger.info("Starting live Event stream")
+        await event_hub.start()
+
+
+async def stop_event_hub(application):
+    if event_hub.running:
+        logger.info("Closing live Event streams")
+        await event_hub.stop()
+
+
+async def start_rollup_scheduler(application):
+    if EVENT_ROLLUP_INTERVAL_SECONDS > 0:
+        logger.info("Starting Event rollup scheduler")
+        application.rollup_scheduler = asyncio.create_task(run_rollup_scheduler())
+
+
+async def start_request_logging(application):
+    start_logging()
+    track_routes(application.router)
+
+
+async def stop_compression_threads(application):
+    stop_compression()
+
+
+async def stop_request_logging(application):
+    stop_logging()
+
+
+async def stop_rollup_scheduler(application):
+    scheduler = getattr(application, "rollup_scheduler", None)
+    if scheduler:
+        scheduler.cancel()
 
 
+app.on_start += start_request_logging
 app.on_start += open_database_connection_pool
+app.on_start += start_event_buffer
+app.on_start += start_rollup_scheduler
+app.on_start += start_event_hub
+# 👇 The buffer drains before the pool closes so that queued Events are still written
+app.on_stop += stop_event_buffer
+# 👇 Ends the open streams, which would otherwise hold the workers up until the shutdown times out
+app.on_stop += stop_event_hub
+app.on_stop += stop_rollup_scheduler
 app.on_stop += close_database_connection_pool
+app.on_stop += stop_compression_threads
+# 👇 Last, so that everything logged while stopping is written out
+app.on_stop += stop_request_logging
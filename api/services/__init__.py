@@ -0,0 +1,76 @@
+"""
+The `services` module contains the logic that sits between the routes in `server.py` and the database.
+
+The items within this module are re-exported here for clean importing elsewhere.
+"""
+
+from .admission import admit_requests as admit_requests
+from .cache import EVENT_CACHE_TTL_SECONDS as EVENT_CACHE_TTL_SECONDS
+from .cache import PERSON_CACHE_TTL_SECONDS as PERSON_CACHE_TTL_SECONDS
+from .cache import cache_key as cache_key
+from .cache import invalidate_persons as invalidate_persons
+from .cache import json_response as json_response
+from .cache import response_cache as response_cache
+from .cache import serialize_response as serialize_response
+from .compression import compress_responses as compress_responses
+from .compression import stop_compression as stop_compression
+from .conditional import event_validators as event_validators
+from .conditional import event_version_select as event_version_select
+from .conditional import events_page_validators as events_page_validators
+from .conditional import has_conditions as has_conditions
+from .conditional import not_modified as not_modified
+from .conditional import person_validators as person_validators
+from .conditional import person_version_select as person_version_select
+from .conditional import persons_page_validators as persons_page_validators
+from .conditional import with_validators as with_validators
+from .events import EVENT_BATCH_MAX_SIZE as EVENT_BATCH_MAX_SIZE
+from .events import EVENT_TYPES as EVENT_TYPES
+from .events import create_event as create_event
+from .events import create_event_query as create_event_query
+from .events import delete_event as delete_event
+from .events import delete_event_query as delete_event_query
+from .events import insert_event_batch as insert_event_batch
+from .events import parse_event_batch as parse_event_batch
+from .events import validate_event as validate_event
+from .events import write_events as write_events
+from .export import stream_ndjson as stream_ndjson
+from .idempotency import IDEMPOTENCY_KEY_TTL_SECONDS as IDEMPOTENCY_KEY_TTL_SECONDS
+from .idempotency import idempotent_event_id as idempotent_event_id
+from .idempotency import idempotent_responses as idempotent_responses
+from .imports import import_persons as import_persons
+from .ingestion import EVENT_BUFFER_RETRY_AFTER as EVENT_BUFFER_RETRY_AFTER
+from .ingestion import EVENT_WRITE_BEHIND as EVENT_WRITE_BEHIND
+from .ingestion import event_buffer as event_buffer
+from .live import EVENT_STREAM as EVENT_STREAM
+from .live import EVENT_STREAM_RETRY_AFTER as EVENT_STREAM_RETRY_AFTER
+from .live import event_hub as event_hub
+from .live import stream_events as stream_events
+from .logs import log_requests as log_requests
+from .logs import logger as logger
+from .logs import start_logging as start_logging
+from .logs import stop_logging as stop_logging
+from .logs import track_routes as track_routes
+from .metrics import record_metrics as record_metrics
+from .metrics import render_metrics as render_metrics
+from .pagination import after_cursor as after_cursor
+from .pagination import decode_cursor as decode_cursor
+from .pagination import page_limit as page_limit
+from .pagination import paginate as paginate
+from .persons import PERSON_EVENTS_PROJECTION as PERSON_EVENTS_PROJECTION
+from .persons import create_person as create_person
+from .persons import delete_person as delete_person
+from .persons import delete_person_query as delete_person_query
+from .persons import person_select as person_select
+from .replicas import read_node as read_node
+from .replicas import route_reads as route_reads
+from .rollups import BUCKET_SIZES as BUCKET_SIZES
+from .rollups import EVENT_ROLLUP_INTERVAL_SECONDS as EVENT_ROLLUP_INTERVAL_SECONDS
+from .rollups import EVENT_STATS_DEFAULT_BUCKETS as EVENT_STATS_DEFAULT_BUCKETS
+from .rollups import event_stats as event_stats
+from .rollups import run_rollup_scheduler as run_rollup_scheduler
+from .search import person_search_select as person_search_select
+from .search import search_query as search_query
+from .serialization import JSON_SERIALIZER as JSON_SERIALIZER
+from .serialization import use_json_serializer as use_json_serializer
+from .summaries import rebuild_person_event_summaries as rebuild_person_event_summaries
+from .summaries import record_events_created as record_events_created
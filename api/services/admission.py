@@ -0,0 +1,138 @@
+from api.constants import custom_response, service_unavailable_message
+from blacksheep import Request, status_code
+from typing import Optional
+import asyncio
+import os
+import time
+
+# 👇 When true, requests wait for one of a limited number of slots (separately for reads and writes) and are turned away with 503 if they wait too long
+ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "true").lower() == "true"
+
+# The number of GET requests each worker handles at once; the rest wait for a slot
+ADMISSION_READ_LIMIT = int(os.environ.get("ADMISSION_READ_LIMIT", 64))
+
+# The number of POST, PUT, PATCH, and DELETE requests each worker handles at once
+ADMISSION_WRITE_LIMIT = int(os.environ.get("ADMISSION_WRITE_LIMIT", 32))
+
+# How long (in milliseconds) a read may wait for a slot before it is answered with 503
+ADMISSION_READ_QUEUE_MS = int(os.environ.get("ADMISSION_READ_QUEUE_MS", 250))
+
+# How long (in milliseconds) a write may wait for a slot before it is answered with 503
+ADMISSION_WRITE_QUEUE_MS = int(os.environ.get("ADMISSION_WRITE_QUEUE_MS", 1000))
+
+# 👇 Extra limits for single routes as 'METHOD /route=limit:queue_ms', comma separated, e.g. 'POST /events/batch=4:2000'
+ADMISSION_ROUTE_LIMITS = os.environ.get("ADMISSION_ROUTE_LIMITS", "")
+
+# The value (in seconds) of the `Retry-After` header sent with a 503
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", 1))
+
+# 👇 Routes that don't touch the database are never held back (so health checks and scrapes work under load)
+UNGATED_ROUTES = {"/", "/cache", "/events/buffer", "/metrics"}
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class AdmissionGate:
+    """
+    Lets at most `limit` requests through at once. A request that finds every slot taken waits in line for at most
+    `queue_ms` milliseconds (or less, if its overall budget runs out sooner) and is turned away after that.
+    """
+    def __init__(self, name: str, limit: int, queue_ms: int):
+        self.name = name
+        self.limit = limit
+        self.queue_ms = queue_ms
+        self._slots = asyncio.Semaphore(limit)
+
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def enter(self, deadline: float) -> bool:
+        if self._slots.locked():
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def leave(self):
+        self.active -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue_ms": self.queue_ms,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+def parse_route_limits(value: str) -> dict:
+    """
+    Parses `ADMISSION_ROUTE_LIMITS` into a map of 'METHOD /route' to its gate.
+    """
+    gates = {}
+    for entry in filter(None, (e.strip() for e in value.split(","))):
+        try:
+            route, limits = entry.rsplit("=", 1)
+            limit, queue_ms = limits.split(":")
+            gates[route.strip()] = AdmissionGate(route.strip(), int(limit), int(queue_ms))
+        except ValueError:
+            raise ValueError(f"`ADMISSION_ROUTE_LIMITS` entries look like 'POST /events/batch=4:2000', not '{entry}'.")
+    return gates
+
+
+read_gate = AdmissionGate("read", ADMISSION_READ_LIMIT, ADMISSION_READ_QUEUE_MS)
+write_gate = AdmissionGate("write", ADMISSION_WRITE_LIMIT, ADMISSION_WRITE_QUEUE_MS)
+route_gates = parse_route_limits(ADMISSION_ROUTE_LIMITS)
+
+
+def admission_gates() -> list:
+    return [read_gate, write_gate, *route_gates.values()]
+
+
+def _overloaded():
+    response = status_code(503, custom_response(data=None, details=service_unavailable_message(retry_after=ADMISSION_RETRY_AFTER), message="Service Unavailable", status_code=503))
+    response.add_header(b"Retry-After", str(ADMISSION_RETRY_AFTER).encode())
+    return response
+
+
+async def admit_requests(request: Request, handler):
+    """
+    Middleware that holds each request until its route's gate (if it has one) and then the read or write gate let it
+    through, and answers 503 with `Retry-After` once it has waited longer than its budget: the route's `queue_ms`,
+    or else that of the read or write gate. Under overload, requests fail fast instead of queueing on the database
+    pool without end.
+    """
+    route = getattr(request, "route", None)
+    if not ADMISSION_CONTROL or route is None or route in UNGATED_ROUTES:
+        return await handler(request)
+
+    gate = read_gate if request.method in READ_METHODS else write_gate
+    route_gate: Optional[AdmissionGate] = route_gates.get(f"{request.method} {route}")
+    deadline = time.monotonic() + (route_gate or gate).queue_ms / 1000
+
+    if route_gate is not None and not await route_gate.enter(deadline):
+        return _overloaded()
+    try:
+        if not await gate.enter(deadline):
+            return _overloaded()
+        try:
+            return await handler(request)
+        finally:
+            gate.leave()
+    finally:
+        if route_gate is not None:
+            route_gate.leave()
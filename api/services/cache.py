@@ -0,0 +1,158 @@
+from blacksheep import Content, Response
+from .serialization import dumps_bytes
+from collections import OrderedDict
+from typing import Iterable, Optional
+import os
+import time
+import uuid
+
+# 👇 When true, `GET /persons/{id}` and `GET /events/{id}` serve repeat requests from an in-process cache
+RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE", "false").lower() == "true"
+
+# The number of responses the cache holds before it evicts the least recently used one
+RESPONSE_CACHE_MAX_SIZE = int(os.environ.get("RESPONSE_CACHE_MAX_SIZE", 10000))
+
+# How long (in seconds) a cached Person stays fresh; Persons change, so keep this short
+PERSON_CACHE_TTL_SECONDS = int(os.environ.get("PERSON_CACHE_TTL_SECONDS", 30))
+
+# How long (in seconds) a cached Event stays fresh; Events are never edited, only deleted
+EVENT_CACHE_TTL_SECONDS = int(os.environ.get("EVENT_CACHE_TTL_SECONDS", 300))
+
+
+class ResponseCache:
+    """
+    A bounded, in-process map of serialized response bodies (or of a body with its validators) with a time-to-live
+    per entry and least recently used eviction. Each entry can carry tags (e.g. the id of the Person it belongs to) so that everything belonging to
+    an entity can be invalidated at once.
+
+    The cache lives in one worker; invalidations don't reach other workers, so their copies expire with the TTL.
+    """
+    def __init__(self, enabled: bool, max_size: int):
+        self.enabled = enabled
+        self.max_size = max_size
+        # 👇 key -> (expires at, body, tags); the most recently used entry is last
+        self._entries: OrderedDict = OrderedDict()
+        self._tagged: dict = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Optional[str]):
+        if not self.enabled or key is None:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, body, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def set(self, key: Optional[str], body, ttl: int, tags: Iterable[str] = ()):
+        if not self.enabled or key is None or ttl <= 0:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + ttl, body, tags)
+        for tag in tags:
+            self._tagged.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, *keys: Optional[str]):
+        """
+        Removes the entries with the given keys, along with every entry tagged with one of them.
+        """
+        if not self.enabled:
+            return
+        for key in keys:
+            if key is None:
+                continue
+            for tagged_key in list(self._tagged.get(key, ())):
+                self._remove(tagged_key)
+                self.invalidations += 1
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def _remove(self, key: str):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def clear(self):
+        self._entries.clear()
+        self._tagged.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache(enabled=RESPONSE_CACHE, max_size=RESPONSE_CACHE_MAX_SIZE)
+
+
+def cache_key(entity: str, id) -> Optional[str]:
+    """
+    Returns the cache key of an entity (e.g. 'person:<uuid>'), or `None` if `id` is not a valid UUID (such a
+    request is never cached).
+    """
+    try:
+        return f"{entity}:{uuid.UUID(str(id))}"
+    except ValueError:
+        return None
+
+
+def serialize_response(message: dict) -> bytes:
+    """
+    Serializes a response envelope exactly as `ok(message=...)` would, without the round trip through `str`.
+    """
+    return dumps_bytes(message)
+
+
+def json_response(body: bytes, status: int = 200, reusable: bool = False) -> Response:
+    """
+    Builds a JSON response from an already-serialized body. Pass `reusable=True` when the very same body is served
+    again (it comes from, or has just been put in, the response cache), so that its compressed copy is kept as well.
+    """
+    response = Response(status, None, Content(b"application/json", body))
+    if reusable:
+        response.reusable_body = True
+    return response
+
+
+def invalidate_persons(person_ids: Iterable):
+    """
+    Drops the cached responses of the given Persons (e.g. after Events were added to them).
+    """
+    response_cache.invalidate(*{cache_key("person", id) for id in person_ids})
@@ -0,0 +1,212 @@
+from blacksheep import Content, Request, Response
+from blacksheep.server.headers.cache import add_vary_header
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import asyncio
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 👇 When true, JSON and text responses are compressed with the best encoding the client accepts (zstd, brotli, or gzip)
+COMPRESSION = os.environ.get("COMPRESSION", "true").lower() == "true"
+
+# Bodies smaller than this (in bytes) are sent as they are; compressing them saves less than it costs
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+
+# The gzip level (1-9); higher is smaller but slower
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6))
+
+# The brotli quality (0-11); the higher levels are far too slow to run on every response
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 5))
+
+# The zstd level (1-22)
+COMPRESSION_ZSTD_LEVEL = int(os.environ.get("COMPRESSION_ZSTD_LEVEL", 3))
+
+# 👇 Bodies at least this large (in bytes) are compressed on a worker thread, so the event loop keeps serving other requests meanwhile
+COMPRESSION_THREAD_MIN_SIZE = int(os.environ.get("COMPRESSION_THREAD_MIN_SIZE", 65536))
+
+# The number of threads each worker compresses large bodies on
+COMPRESSION_THREADS = int(os.environ.get("COMPRESSION_THREADS", 2))
+
+# The number of compressed copies of cached response bodies kept; the least recently used go first
+COMPRESSION_CACHE_MAX_SIZE = int(os.environ.get("COMPRESSION_CACHE_MAX_SIZE", 1000))
+
+# 👇 Only text compresses well; images and archives are already compressed
+COMPRESSIBLE_TYPES = (b"json", b"text/", b"xml", b"csv", b"javascript")
+
+
+def _compress_gzip(body: bytes) -> bytes:
+    # 👇 A fixed mtime keeps the output the same for the same body
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def _compress_brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+
+
+def _compress_zstd(body: bytes) -> bytes:
+    # 👇 A compressor can't be shared between threads, and creating one is cheap next to compressing a large body
+    return zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compress(body)
+
+
+# 👇 Content-coding -> compressor, in the order picked when the client accepts several equally
+ENCODERS = {
+    name: compress
+    for name, compress, available in (
+        ("zstd", _compress_zstd, zstandard is not None),
+        ("br", _compress_brotli, brotli is not None),
+        ("gzip", _compress_gzip, True),
+    )
+    if available
+}
+
+
+def negotiate_encoding(accept_encoding: Optional[bytes]) -> Optional[str]:
+    """
+    Returns the content-coding (of `ENCODERS`) with the highest weight in an `Accept-Encoding` header, or `None` if the
+    client accepts none of them. Ties go to the better compressor.
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.decode("latin-1").lower().split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip()] = weight
+
+    best, best_weight = None, 0.0
+    for name in ENCODERS:
+        weight = weights.get(name, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+class CompressedBodies:
+    """
+    A bounded map of (content-coding, body) to the compressed body, for bodies that are served again and again (those
+    of cached responses). It is keyed on the body itself rather than on a cache key, so a changed body can never get
+    a stale compressed copy; Python caches the hash of a `bytes` object, so looking up the same body again is cheap.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, encoding: str, body: bytes) -> Optional[bytes]:
+        compressed = self._entries.get((encoding, body))
+        if compressed is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((encoding, body))
+        self.hits += 1
+        return compressed
+
+    def set(self, encoding: str, body: bytes, compressed: bytes):
+        if self.max_size <= 0:
+            return
+        self._entries[(encoding, body)] = compressed
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class CompressionStats:
+    __slots__ = ("responses", "bytes_in", "bytes_out", "threaded")
+
+    def __init__(self):
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.threaded = 0
+
+
+compressed_bodies = CompressedBodies(max_size=COMPRESSION_CACHE_MAX_SIZE)
+compression_stats = CompressionStats()
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _compressible(response: Response) -> bool:
+    content = response.content
+    return (
+        content is not None
+        and content.body is not None
+        and len(content.body) >= COMPRESSION_MIN_SIZE
+        and content.type is not None
+        and any(t in content.type.lower() for t in COMPRESSIBLE_TYPES)
+        and response.get_first_header(b"Content-Encoding") is None
+    )
+
+
+async def compress(encoding: str, body: bytes) -> bytes:
+    """
+    Compresses a body, on a worker thread when it is at least `COMPRESSION_THREAD_MIN_SIZE` bytes.
+    """
+    global _executor
+    if len(body) < COMPRESSION_THREAD_MIN_SIZE:
+        return ENCODERS[encoding](body)
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=COMPRESSION_THREADS, thread_name_prefix="compression")
+    compression_stats.threaded += 1
+    return await asyncio.get_running_loop().run_in_executor(_executor, ENCODERS[encoding], body)
+
+
+def stop_compression():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+async def compress_responses(request: Request, handler):
+    """
+    Middleware that compresses JSON and text bodies of at least `COMPRESSION_MIN_SIZE` bytes with the encoding the
+    client prefers. Streamed responses (the NDJSON export and the live Event stream) are sent as they are. The
+    compressed copy of a response marked `reusable_body` (see `json_response`) is kept and served again for the same body.
+    """
+    response = await handler(request)
+    if not COMPRESSION or response is None or not _compressible(response):
+        return response
+
+    # 👇 The response differs by `Accept-Encoding` even when this client gets it uncompressed
+    add_vary_header(response, [b"Accept-Encoding"])
+    encoding = negotiate_encoding(request.get_first_header(b"Accept-Encoding"))
+    if encoding is None:
+        return response
+
+    body = response.content.body
+    reusable = getattr(response, "reusable_body", False)
+    compressed = compressed_bodies.get(encoding, body) if reusable else None
+    if compressed is None:
+        compressed = await compress(encoding, body)
+        if reusable:
+            compressed_bodies.set(encoding, body, compressed)
+
+    compression_stats.responses += 1
+    compression_stats.bytes_in += len(body)
+    compression_stats.bytes_out += len(compressed)
+
+    response.with_content(Content(response.content.type, compressed))
+    response.add_header(b"Content-Encoding", encoding.encode())
+    return response
@@ -0,0 +1,154 @@
+from api.db.tables.event import Event
+from api.db.tables.person import Person
+from .persons import PERSON_EVENTS_LIMIT, PERSON_EVENTS_PROJECTION
+from blacksheep import Request, Response
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from piccolo.query import Select
+from piccolo.querystring import QueryString
+from typing import NamedTuple, Optional
+import hashlib
+import json
+import os
+
+# 👇 When true, person and event reads carry `ETag` and `Last-Modified`, and matching conditional requests get a bodiless 304
+CONDITIONAL_GET = os.environ.get("CONDITIONAL_GET", "true").lower() == "true"
+
+
+class Validators(NamedTuple):
+    """
+    The `ETag` and `Last-Modified` of a response.
+    """
+    etag: str
+    last_modified: Optional[datetime]
+
+
+def make_validators(parts: tuple, last_modified: Optional[datetime]) -> Validators:
+    """
+    Hashes what a response is built from (rather than the response itself) into a weak `ETag`, so that the same
+    validator can be computed from a narrow query without building the body.
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return Validators(etag=f'W/"{digest}"', last_modified=last_modified)
+
+
+def has_conditions(request: Request) -> bool:
+    return CONDITIONAL_GET and (
+        request.get_first_header(b"If-None-Match") is not None or request.get_first_header(b"If-Modified-Since") is not None
+    )
+
+
+def _matches(if_none_match: bytes, etag: str) -> bool:
+    # 👇 Weak comparison (as GET and HEAD use): `W/"x"` and `"x"` are the same tag
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.decode("latin-1").split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def _unmodified_since(if_modified_since: bytes, last_modified: Optional[datetime]) -> bool:
+    if last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since.decode("latin-1"))
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # 👇 HTTP dates are whole seconds
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+
+def not_modified(request: Request, validators: Optional[Validators]) -> Optional[Response]:
+    """
+    Returns a 304 response if the request's `If-None-Match` (or, without one, `If-Modified-Since`) shows that the
+    client already has the current representation, or `None` if the full response should be sent.
+    """
+    if validators is None or not CONDITIONAL_GET:
+        return None
+    if_none_match = request.get_first_header(b"If-None-Match")
+    if if_none_match is not None:
+        fresh = _matches(if_none_match, validators.etag)
+    else:
+        if_modified_since = request.get_first_header(b"If-Modified-Since")
+        fresh = if_modified_since is not None and _unmodified_since(if_modified_since, validators.last_modified)
+    return with_validators(Response(304), validators) if fresh else None
+
+
+def with_validators(response: Response, validators: Optional[Validators]) -> Response:
+    if validators is None or not CONDITIONAL_GET:
+        return response
+    response.add_header(b"ETag", validators.etag.encode())
+    if validators.last_modified is not None:
+        last_modified = format_datetime(validators.last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+        response.add_header(b"Last-Modified", last_modified.encode())
+    return response
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def _newest_event_ids_projection() -> QueryString:
+    """
+    A select column with the ids of the Person's newest `PERSON_EVENTS_LIMIT` Events (the ones `events_projection`
+    returns), as a JSON array.
+    """
+    return QueryString(
+        "COALESCE(("
+        'SELECT json_agg(e."id") FROM (SELECT "id" FROM "event" '
+        'WHERE "event"."person_id" = "person"."id" '
+        'ORDER BY "event"."datetime_created" DESC, "event"."id" DESC LIMIT {}) AS e'
+        "), '[]'::json) AS \"event_ids\"",
+        PERSON_EVENTS_LIMIT,
+    )
+
+
+def person_version_select() -> Select:
+    """
+    Selects only what a Person's validators depend on: when it was modified and, when `PERSON_EVENTS_PROJECTION` is
+    true (so that its `events` come from the `event` table), the ids of its newest Events.
+    """
+    columns = [Person.id, Person.datetime_created, Person.datetime_modified]
+    if PERSON_EVENTS_PROJECTION:
+        columns.append(_newest_event_ids_projection())
+    return Person.select(*columns)
+
+
+def event_version_select() -> Select:
+    """
+    Selects only what an Event's validators depend on. Events are never edited, so their id and creation time are enough.
+    """
+    return Event.select(Event.id, Event.datetime_created)
+
+
+def _person_version(person: dict) -> tuple:
+    """
+    Works on a row of `person_version_select` as well as on a full Person (with its `events` decoded).
+    """
+    if not PERSON_EVENTS_PROJECTION:
+        return (str(person["id"]), person["datetime_modified"])
+    if "event_ids" in person:
+        event_ids = json.loads(person["event_ids"]) if isinstance(person["event_ids"], str) else person["event_ids"]
+    else:
+        event_ids = [event["id"] for event in person["events"]]
+    return (str(person["id"]), person["datetime_modified"], tuple(str(id) for id in event_ids))
+
+
+def person_validators(person: dict) -> Validators:
+    return make_validators(("person", *_person_version(person)), person["datetime_modified"])
+
+
+def persons_page_validators(persons: list, next_cursor: Optional[str], cursor: Optional[str], limit: int) -> Validators:
+    last_modified = max((p["datetime_modified"] for p in persons), default=None)
+    return make_validators(("persons", cursor, limit, next_cursor, *(_person_version(p) for p in persons)), last_modified)
+
+
+def event_validators(event: dict) -> Validators:
+    return make_validators(("event", str(event["id"]), event["datetime_created"]), event["datetime_created"])
+
+
+def events_page_validators(events: list, next_cursor: Optional[str], cursor: Optional[str], limit: int, filters: tuple) -> Validators:
+    """
+    The validators of a page of Events: its newest `datetime_created` and the number (and ids) of the Events on it.
+    """
+    last_modified = max((e["datetime_created"] for e in events), default=None)
+    ids = tuple(str(e["id"]) for e in events)
+    return make_validators(("events", cursor, limit, filters, next_cursor, len(ids), ids), last_modified)
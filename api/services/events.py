@@ -0,0 +1,253 @@
+from api.constants import not_found_by_id_message
+from api.db.partitions import EVENT_PARTITIONING
+from api.db.tables.event import Event, EventType
+from api.db.tables.event_key import EventKey
+from api.db.tables.person import Person
+from api.models import EventPostModel
+from .cache import invalidate_persons
+from .rollups import events_deleted_rollup_update
+from .summaries import event_deleted_update, events_created_upsert, record_events_created
+from asyncpg.exceptions import ForeignKeyViolationError, UniqueViolationError
+from datetime import datetime
+from piccolo.query.methods.raw import Raw
+from piccolo.querystring import QueryString
+from pydantic import ValidationError
+from typing import Optional
+import json
+import os
+import uuid
+
+# The largest number of Events accepted by a single `POST /events/batch` request
+EVENT_BATCH_MAX_SIZE = int(os.environ.get("EVENT_BATCH_MAX_SIZE", 5000))
+
+# 👇 asyncpg caps a single statement at 32767 bind parameters; an Event row uses 4 of them
+EVENT_INSERT_CHUNK_SIZE = 1000
+
+EVENT_TYPES = [e.value for e in EventType]
+
+
+def parse_event_batch(body: bytes, ndjson: bool = False) -> list:
+    """
+    Parses the body of a batch request into a list of raw items. The body is either a JSON array
+    or, when `ndjson` is true, one JSON object per line. A malformed NDJSON line is kept as an
+    `Exception` so that it can be rejected on its own without failing the rest of the batch.
+    """
+    if not ndjson:
+        items = json.loads(body)
+        if not isinstance(items, list):
+            raise ValueError("The request body must be a JSON array of Events.")
+        return items
+
+    items = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError as e:
+            items.append(e)
+    return items
+
+
+def validate_event(item) -> dict:
+    """
+    Validates a raw Event item without touching the database and returns it as a dict that is ready to be
+    inserted (a missing `id` or `datetime_created` is filled in). Raises a `ValueError` describing the problem
+    if the item is invalid.
+    """
+    if isinstance(item, Exception):
+        raise ValueError(f"The item is not valid JSON. Details: {item}")
+    if not isinstance(item, dict):
+        raise ValueError("Each item must be a JSON object.")
+
+    try:
+        event = EventPostModel(**item).dict()
+    except ValidationError as e:
+        raise ValueError(f"The item is invalid. Details: {e}")
+
+    if event["event_type"] not in EVENT_TYPES:
+        raise ValueError(f"`event_type` must be one of {EVENT_TYPES}.")
+    if event["person_id"] is None:
+        raise ValueError("`person_id` is required.")
+
+    if event["id"] is None:
+        event["id"] = uuid.uuid4()
+    if event["datetime_created"] is None:
+        event["datetime_created"] = datetime.utcnow()
+
+    return event
+
+
+async def write_events(events: list) -> dict:
+    """
+    Writes already-validated Events and returns a map of each Event id to `None` if it was created, or to the
+    reason it was not.
+
+    Every referenced `person_id` is confirmed with a single query, and the Events are then written with
+    multi-row INSERT statements in one transaction (along with their Persons' summaries). An Event whose id
+    already exists is skipped. The cached responses of the affected Persons are dropped afterwards.
+    """
+    outcomes: dict = {}
+    if not events:
+        return outcomes
+
+    # 👇 One set-based lookup for every Person referenced by the Events
+    person_ids = {event["person_id"] for event in events}
+    existing_persons = await Person.select(Person.id).where(Person.id.is_in(list(person_ids))).run()
+    existing_person_ids = {p["id"] for p in existing_persons}
+
+    rows = []
+    for event in events:
+        if event["person_id"] not in existing_person_ids:
+            outcomes[event["id"]] = not_found_by_id_message(ent='Person', id=event["person_id"])
+            continue
+        rows.append(event)
+
+    created_ids = set()
+    if rows:
+        async with Event._meta.db.transaction():
+            for start in range(0, len(rows), EVENT_INSERT_CHUNK_SIZE):
+                chunk = rows[start:start + EVENT_INSERT_CHUNK_SIZE]
+                if EVENT_PARTITIONING:
+                    # 👇 The partitioned primary key includes `datetime_created`, so ids are claimed in `event_key` first
+                    claimed = await event_keys_insert(chunk).on_conflict(action="DO NOTHING").returning(EventKey.id).run()
+                    claimed_ids = {row["id"] for row in claimed}
+                    # 👇 One Event per claimed id, should the chunk repeat an id
+                    chunk = list({event["id"]: event for event in reversed(chunk) if event["id"] in claimed_ids}.values())
+                    if not chunk:
+                        continue
+                # 👇 Ids that already exist are skipped rather than failing the whole statement
+                inserted = await Event.insert(
+                    *[Event(**event) for event in chunk]
+                ).on_conflict(action="DO NOTHING").returning(Event.id).run()
+                inserted_ids = {row["id"] for row in inserted}
+                await record_events_created([event for event in chunk if event["id"] in inserted_ids])
+                created_ids.update(inserted_ids)
+        # 👇 After the commit, so a concurrent read can't cache the Persons as they were before
+        invalidate_persons({event["person_id"] for event in rows if event["id"] in created_ids})
+
+    for event in rows:
+        outcomes[event["id"]] = None if event["id"] in created_ids else "An Event with this `id` already exists."
+
+    return outcomes
+
+
+def event_keys_insert(events: list):
+    """
+    The INSERT of the `event_key` rows of Events (written alongside them with `EVENT_PARTITIONING`).
+    """
+    return EventKey.insert(*[EventKey(id=event["id"], datetime_created=event["datetime_created"]) for event in events])
+
+
+def event_keys_delete(deleted: str) -> QueryString:
+    """
+    The DELETE that removes the `event_key` rows of deleted Events, where `deleted` names the relation holding the
+    deleted Event rows (e.g. the CTE of a `DELETE ... RETURNING`).
+    """
+    return QueryString(f'DELETE FROM "event_key" WHERE "id" IN (SELECT "id" FROM "{deleted}")')
+
+
+def create_event_query(event: dict) -> Raw:
+    """
+    The single statement `create_event` runs: the Event insert with its summary upsert chained as a CTE. With
+    `EVENT_PARTITIONING`, the Event's `event_key` row is inserted too, so a reused id fails the statement just as the
+    unpartitioned primary key would.
+    """
+    if not EVENT_PARTITIONING:
+        return Event.raw(
+            'WITH "created_event" AS ({}), "summary" AS ({}) SELECT * FROM "created_event"',
+            Event.insert(Event(**event)).returning(*Event._meta.columns).querystrings[0],
+            events_created_upsert([event]),
+        )
+    return Event.raw(
+        'WITH "key" AS ({}), "created_event" AS ({}), "summary" AS ({}) SELECT * FROM "created_event"',
+        event_keys_insert([event]).querystrings[0],
+        Event.insert(Event(**event)).returning(*Event._meta.columns).querystrings[0],
+        events_created_upsert([event]),
+    )
+
+
+async def create_event(event: dict) -> Optional[dict]:
+    """
+    Inserts an already-validated Event and adds it to its Person's summary in a single statement, and returns the
+    created Event, or `None` if its Person doesn't exist. The foreign key decides that, so there is no separate
+    lookup.
+
+    If an Event with the same id already exists (a retry of an idempotent request), nothing is written and the
+    existing Event is returned instead. Raises a `ValueError` if that Event belongs to another Person.
+    """
+    try:
+        rows = await create_event_query(event).run()
+    except ForeignKeyViolationError:
+        return None
+    except UniqueViolationError:
+        # 👇 The whole statement was rolled back, so the summary wasn't counted twice either (with `EVENT_PARTITIONING` the
+        # Event may have another `datetime_created`, so it is looked up by id alone)
+        existing = await Event.select().where(Event.id == event["id"]).first().run()
+        if existing is None or str(existing["person_id"]) != str(event["person_id"]):
+            raise ValueError("An Event with this `id` already exists.")
+        return existing
+
+    invalidate_persons([event["person_id"]])
+    return rows[0]
+
+
+def delete_event_query(id) -> Raw:
+    keys = ', "keys" AS ({})' if EVENT_PARTITIONING else ""
+    return Event.raw(
+        'WITH "deleted_event" AS ({}), "summary" AS ({}), "rollups" AS ({})' + keys + ' SELECT * FROM "deleted_event"',
+        Event.delete().where(Event.id == id).returning(*Event._meta.columns).querystrings[0],
+        event_deleted_update("deleted_event"),
+        events_deleted_rollup_update("deleted_event"),
+        *([event_keys_delete("deleted_event")] if EVENT_PARTITIONING else []),
+    )
+
+
+async def delete_event(id) -> Optional[dict]:
+    """
+    Deletes an Event and removes it from its Person's summary and from the Event rollups in a single statement, and
+    returns the deleted Event, or `None` if there was no Event with that id.
+    """
+    rows = await delete_event_query(id).run()
+    return rows[0] if rows else None
+
+
+def _rejected(index: int, id, reason: str) -> dict:
+    return {"index": index, "id": id, "status": "rejected", "reason": reason}
+
+
+async def insert_event_batch(items: list) -> list:
+    """
+    Validates and inserts a batch of Events, returning a result for every item in the order it was received.
+    Items that fail validation, reference an unknown Person, or reuse an existing Event id are rejected with a
+    reason instead of failing the whole batch.
+    """
+    results: list = [None] * len(items)
+    pending: list = []
+    seen_ids: set = set()
+
+    for index, item in enumerate(items):
+        try:
+            event = validate_event(item)
+        except ValueError as e:
+            id = item.get("id") if isinstance(item, dict) else None
+            results[index] = _rejected(index, id, str(e))
+            continue
+
+        if event["id"] in seen_ids:
+            results[index] = _rejected(index, event["id"], "The `id` appears more than once in the batch.")
+            continue
+        seen_ids.add(event["id"])
+
+        pending.append((index, event))
+
+    outcomes = await write_events([event for _, event in pending])
+
+    for index, event in pending:
+        reason = outcomes[event["id"]]
+        if reason is None:
+            results[index] = {"index": index, "id": event["id"], "status": "created", "reason": None}
+        else:
+            results[index] = _rejected(index, event["id"], reason)
+
+    return results
@@ -0,0 +1,29 @@
+from .cache import ResponseCache
+from typing import Optional
+import os
+import uuid
+
+# The number of recent responses to `POST /events` kept to answer retries with; the least recently used go first
+IDEMPOTENCY_CACHE_MAX_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_MAX_SIZE", 10000))
+
+# How long (in seconds) a retry is answered from memory; later retries are still caught by the `event`
+# primary key (or, with `EVENT_PARTITIONING`, the `event_key` one)
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_KEY_TTL_SECONDS", 86400))
+
+# 👇 Never change this: it would give retries of requests sent before the change new Event ids
+IDEMPOTENCY_NAMESPACE = uuid.UUID("6f1c3a52-0a4e-4c55-9a35-2b8f0d9e7c41")
+
+# 👇 Event id -> the serialized response that created it
+idempotent_responses = ResponseCache(enabled=True, max_size=IDEMPOTENCY_CACHE_MAX_SIZE)
+
+
+def idempotent_event_id(idempotency_key: Optional[str], person_id) -> Optional[uuid.UUID]:
+    """
+    Derives the id of the Event created by a request with the given `Idempotency-Key` header, or returns `None`
+    without a key. The same key (for the same Person) always gives the same id, so a retry can't insert a second
+    row: the primary key turns it away (the `event_key` one with `EVENT_PARTITIONING`, whose `event` primary key also
+    includes `datetime_created`, which a retry doesn't repeat).
+    """
+    if not idempotency_key:
+        return None
+    return uuid.uuid5(IDEMPOTENCY_NAMESPACE, f"{person_id}:{idempotency_key}")
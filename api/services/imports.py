@@ -0,0 +1,188 @@
+from api.db.tables.event import Event
+from api.db.tables.person import Person, Role
+from api.models import PersonPostModel
+from .logs import logger
+from .persons import PERSON_EVENTS_PROJECTION, new_signup_event
+from .summaries import events_created_upsert
+from datetime import datetime
+from pydantic import ValidationError
+from typing import AsyncIterator
+import csv
+import json
+import os
+import uuid
+
+# The number of rows validated and written together (in one statement, so one round trip and one transaction)
+PERSON_IMPORT_CHUNK_SIZE = int(os.environ.get("PERSON_IMPORT_CHUNK_SIZE", 1000))
+
+# 👇 Every row is rejected or created, but only this many rejections are described in the report, so it stays small
+PERSON_IMPORT_MAX_ERRORS = int(os.environ.get("PERSON_IMPORT_MAX_ERRORS", 1000))
+
+# The longest line (in bytes) an upload may contain; a longer one ends the import
+PERSON_IMPORT_MAX_LINE_BYTES = int(os.environ.get("PERSON_IMPORT_MAX_LINE_BYTES", 65536))
+
+# 👇 asyncpg caps a single statement at 32767 bind parameters; a row uses 18 of them (its Person, signup Event, and summary)
+PERSON_IMPORT_MAX_CHUNK_SIZE = 1800
+
+ROLES = [r.value for r in Role]
+
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Splits a stream of body chunks into lines as they arrive, holding no more than one unfinished line in memory.
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+        if len(pending) > PERSON_IMPORT_MAX_LINE_BYTES:
+            raise ValueError(f"The upload contains a line longer than {PERSON_IMPORT_MAX_LINE_BYTES} bytes.")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+
+async def ndjson_rows(lines: AsyncIterator[bytes]) -> AsyncIterator:
+    """
+    Yields each non-blank line as a dict, or as the `Exception` that explains why it isn't one.
+    """
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            yield row if isinstance(row, dict) else ValueError("Each line must be a JSON object.")
+        except ValueError as e:
+            yield e
+
+
+async def csv_rows(lines: AsyncIterator[bytes]) -> AsyncIterator:
+    """
+    Yields each record after the header line as a dict of the header's columns, or as the `Exception` that explains
+    why it can't be read. Empty cells are left out, so they count as missing. A quoted value may span several lines.
+    """
+    header = None
+    record = ""
+    async for line in lines:
+        # 👇 Spreadsheet exports often start with a byte order mark
+        text = line.decode("utf-8-sig" if header is None and not record else "utf-8", errors="replace")
+        record = f"{record}\n{text}" if record else text
+        # 👇 An odd number of quotes means a quoted value continues on the next line
+        if record.count('"') % 2:
+            if len(record) > PERSON_IMPORT_MAX_LINE_BYTES:
+                raise ValueError(f"The upload contains a row longer than {PERSON_IMPORT_MAX_LINE_BYTES} bytes.")
+            continue
+        if not record.strip():
+            record = ""
+            continue
+
+        values = next(csv.reader([record]))
+        record = ""
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        if len(values) != len(header):
+            yield ValueError(f"The row has {len(values)} columns, but the header has {len(header)}.")
+            continue
+        yield {column: value for column, value in zip(header, values) if value != ""}
+
+    if record:
+        yield ValueError("The upload ends inside a quoted value.")
+    if header is None:
+        raise ValueError("The CSV upload is empty; its first line must be a header such as 'email,first_name,last_name,role'.")
+
+
+def validate_person(row) -> dict:
+    """
+    Validates a raw row the way `POST /persons` validates its body (and checks `role` too), and returns the Person
+    it describes, with a new id and timestamps. Raises a `ValueError` describing the problem if the row is invalid.
+    """
+    if isinstance(row, Exception):
+        raise ValueError(f"The row could not be read. Details: {row}")
+
+    try:
+        person = PersonPostModel(**row).dict()
+    except ValidationError as e:
+        raise ValueError(f"The row is invalid. Details: {e}")
+
+    role = person["role"].value if isinstance(person["role"], Role) else person["role"]
+    if role not in ROLES:
+        raise ValueError(f"`role` must be one of {ROLES}.")
+
+    now = datetime.utcnow()
+    person.update(id=uuid.uuid4(), datetime_created=now, datetime_modified=now, role=role)
+    return person
+
+
+async def insert_person_chunk(persons: list) -> int:
+    """
+    Creates a chunk of already-validated Persons together with their signup Events and Event summaries, and returns
+    the number created. Like `create_person`, the three multi-row inserts are chained as CTEs in one statement.
+    """
+    signup_events = [new_signup_event(person["id"]) for person in persons]
+    for person, signup_event in zip(persons, signup_events):
+        person["events"] = [] if PERSON_EVENTS_PROJECTION else [signup_event]
+
+    rows = await Person.raw(
+        'WITH "created_persons" AS ({}), "signup_events" AS ({}), "summaries" AS ({}) '
+        'SELECT count(*) AS "created" FROM "created_persons"',
+        Person.insert(*[Person(**person) for person in persons]).returning(Person.id).querystrings[0],
+        Event.insert(*[Event(**event) for event in signup_events]).querystrings[0],
+        events_created_upsert(signup_events),
+    ).run()
+    return rows[0]["created"]
+
+
+async def import_persons(chunks: AsyncIterator[bytes], ndjson: bool) -> dict:
+    """
+    Creates a Person (with its signup Event) for every valid row of a CSV or NDJSON upload, read from `chunks` as it
+    arrives. Rows are validated and written `PERSON_IMPORT_CHUNK_SIZE` at a time, so memory stays the same however
+    large the upload is. Returns a report of the rows received, created, and rejected (each with its row number and
+    reason); a chunk that fails to write rejects all of its rows, and the import carries on with the next one. If
+    the upload itself can't be read any further, the rows before that point are still written and `aborted` says why.
+    """
+    chunk_size = max(1, min(PERSON_IMPORT_CHUNK_SIZE, PERSON_IMPORT_MAX_CHUNK_SIZE))
+    report = {"received": 0, "created": 0, "rejected": 0, "chunks": 0, "errors": [], "errors_truncated": False, "aborted": None}
+
+    def reject(row_number: int, reason: str):
+        report["rejected"] += 1
+        if len(report["errors"]) < PERSON_IMPORT_MAX_ERRORS:
+            report["errors"].append({"row": row_number, "reason": reason})
+        else:
+            report["errors_truncated"] = True
+
+    async def flush(pending: list):
+        report["chunks"] += 1
+        first_row, last_row = pending[0][0], pending[-1][0]
+        try:
+            report["created"] += await insert_person_chunk([person for _, person in pending])
+        except Exception as e:
+            logger.warning(
+                f"Unable to import the chunk of Persons on rows {first_row}-{last_row}",
+                exc_info=e, extra={"count": len(pending), "first_row": first_row, "last_row": last_row},
+            )
+            for row_number, _ in pending:
+                reject(row_number, f"The chunk this row was in could not be written. Details: {e}")
+            return
+        logger.info("Imported a chunk of Persons", extra={"first_row": first_row, "last_row": last_row, "received": report["received"], "imported": report["created"], "rejected": report["rejected"]})
+
+    rows = ndjson_rows(read_lines(chunks)) if ndjson else csv_rows(read_lines(chunks))
+    pending: list = []
+    try:
+        async for row in rows:
+            report["received"] += 1
+            try:
+                pending.append((report["received"], validate_person(row)))
+            except ValueError as e:
+                reject(report["received"], str(e))
+                continue
+            if len(pending) >= chunk_size:
+                await flush(pending)
+                pending = []
+    except ValueError as e:
+        report["aborted"] = str(e)
+
+    if pending:
+        await flush(pending)
+    return report
@@ -0,0 +1,143 @@
+from .events import write_events
+from .logs import logger
+from typing import Optional
+import asyncio
+import os
+import time
+
+# 👇 When true, `POST /events` queues validated Events and returns 202 instead of writing them during the request
+EVENT_WRITE_BEHIND = os.environ.get("EVENT_WRITE_BEHIND", "false").lower() == "true"
+
+# The number of Events the buffer can hold before `POST /events` starts answering 503
+EVENT_BUFFER_MAX_SIZE = int(os.environ.get("EVENT_BUFFER_MAX_SIZE", 10000))
+
+# The buffer is flushed when it holds this many Events...
+EVENT_BUFFER_FLUSH_SIZE = int(os.environ.get("EVENT_BUFFER_FLUSH_SIZE", 500))
+
+# ...or when the oldest queued Event has waited this long, whichever comes first
+EVENT_BUFFER_FLUSH_INTERVAL_MS = int(os.environ.get("EVENT_BUFFER_FLUSH_INTERVAL_MS", 250))
+
+# The value (in seconds) of the `Retry-After` header sent when the buffer is full
+EVENT_BUFFER_RETRY_AFTER = int(os.environ.get("EVENT_BUFFER_RETRY_AFTER", 1))
+
+
+class EventBuffer:
+    """
+    An in-process, bounded queue of validated Events that a background task writes to the database in bulk.
+    """
+    def __init__(self, max_size: int, flush_size: int, flush_interval_ms: int):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+
+        self.accepted = 0
+        self.overflowed = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.flush_ms_total = 0.0
+        self.flush_ms_max = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    def offer(self, event: dict) -> bool:
+        """
+        Queues an Event without waiting. Returns `False` if the buffer is full (or not running) so the caller
+        can apply backpressure.
+        """
+        if not self._accepting:
+            return False
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed += 1
+            return False
+        self.accepted += 1
+        return True
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._accepting = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops accepting Events and waits until everything already queued has been written.
+        """
+        if self._task is None:
+            return
+        self._accepting = False
+        # 👇 A `None` marks the end of the queue; everything queued before it is flushed first
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.flush_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if event is None:
+                    stopping = True
+                    break
+                batch.append(event)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        started = time.perf_counter()
+        try:
+            outcomes = await write_events(batch)
+            created = sum(1 for reason in outcomes.values() if reason is None)
+            self.flushed += created
+            self.dropped += len(batch) - created
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error("Unable to flush buffered Events", exc_info=e, extra={"count": len(batch)})
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.flush_ms_total += elapsed_ms
+            self.flush_ms_max = max(self.flush_ms_max, elapsed_ms)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": EVENT_WRITE_BEHIND,
+            "capacity": self.max_size,
+            "depth": self._queue.qsize() if self._queue else 0,
+            "accepted": self.accepted,
+            "overflowed": self.overflowed,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "flush_ms_avg": round(self.flush_ms_total / self.flushes, 3) if self.flushes else 0.0,
+            "flush_ms_max": round(self.flush_ms_max, 3),
+        }
+
+
+event_buffer = EventBuffer(
+    max_size=EVENT_BUFFER_MAX_SIZE,
+    flush_size=EVENT_BUFFER_FLUSH_SIZE,
+    flush_interval_ms=EVENT_BUFFER_FLUSH_INTERVAL_MS,
+)
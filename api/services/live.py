@@ -0,0 +1,210 @@
+from api.db.notifications import EVENT_CREATED_CHANNEL
+from .logs import logger
+from .serialization import loads
+from piccolo.engine import engine_finder
+from typing import Optional
+import asyncio
+import asyncpg
+import os
+
+# 👇 When true, each worker keeps one connection listening for new Events and `GET /events/stream` pushes them to clients
+EVENT_STREAM = os.environ.get("EVENT_STREAM", "true").lower() == "true"
+
+# The number of Events a client may fall behind by before it is disconnected
+EVENT_STREAM_QUEUE_SIZE = int(os.environ.get("EVENT_STREAM_QUEUE_SIZE", 256))
+
+# The number of clients each worker streams to at once; more are answered with 503
+EVENT_STREAM_MAX_CLIENTS = int(os.environ.get("EVENT_STREAM_MAX_CLIENTS", 1000))
+
+# 👇 How often (in seconds) an idle stream gets a comment line, which keeps proxies from closing it and notices clients that left
+EVENT_STREAM_HEARTBEAT_SECONDS = float(os.environ.get("EVENT_STREAM_HEARTBEAT_SECONDS", 15))
+
+# How long (in seconds) to wait before listening again after the listening connection is lost
+EVENT_STREAM_RECONNECT_SECONDS = float(os.environ.get("EVENT_STREAM_RECONNECT_SECONDS", 5))
+
+# The value (in seconds) of the `Retry-After` header sent when a worker already streams to `EVENT_STREAM_MAX_CLIENTS` clients
+EVENT_STREAM_RETRY_AFTER = int(os.environ.get("EVENT_STREAM_RETRY_AFTER", 5))
+
+HEARTBEAT = b": heartbeat\n\n"
+
+# 👇 The last frames of a stream; a subscriber's queue holds one of these (and nothing else) once it has been cut off
+DROPPED = b'event: dropped\ndata: {"reason":"The client fell too far behind and was disconnected; reconnect to continue."}\n\n'
+CLOSED = b'event: closed\ndata: {"reason":"The server is shutting down; reconnect to continue."}\n\n'
+
+
+class Subscriber:
+    """
+    A client of `GET /events/stream`: its filters and the queue of frames waiting to be written to it.
+    """
+    __slots__ = ("event_type", "person_id", "queue")
+
+    def __init__(self, event_type: Optional[str], person_id: Optional[str], queue_size: int):
+        self.event_type = event_type
+        self.person_id = person_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def matches(self, event: dict) -> bool:
+        return (self.event_type is None or self.event_type == event["event_type"]) and \
+            (self.person_id is None or self.person_id == event["person_id"])
+
+    def end(self, frame: bytes):
+        """
+        Throws away the frames not yet written and leaves `frame` as the last one.
+        """
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(frame)
+
+
+class EventHub:
+    """
+    Fans the notifications of one shared LISTEN connection out to every subscriber of this worker. Each notification
+    is encoded as a Server-Sent Events frame once and the same bytes are queued for every subscriber whose filters
+    match. A subscriber whose queue is full is dropped rather than slowing down (or buffering without end for) the rest.
+    """
+    def __init__(self, queue_size: int, max_clients: int):
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self.subscribers: set = set()
+        self._task: Optional[asyncio.Task] = None
+        self._connection: Optional[asyncpg.Connection] = None
+
+        self.listening = False
+        self.notifications = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.reconnects = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def subscribe(self, event_type: Optional[str] = None, person_id: Optional[str] = None) -> Optional[Subscriber]:
+        """
+        Returns a new subscriber for the Events matching the filters, or `None` if this worker already streams to
+        `max_clients` clients.
+        """
+        if len(self.subscribers) >= self.max_clients:
+            self.rejected += 1
+            return None
+        subscriber = Subscriber(event_type, person_id, self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, payload: str):
+        """
+        Queues a notification payload (an Event as JSON) for every subscriber it matches, without waiting.
+        """
+        self.notifications += 1
+        if not self.subscribers:
+            return
+        event = loads(payload)
+        frame = b"id: " + event["id"].encode() + b"\nevent: event\ndata: " + payload.encode() + b"\n\n"
+        for subscriber in list(self.subscribers):
+            if not subscriber.matches(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(frame)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self.dropped += 1
+                self.subscribers.discard(subscriber)
+                subscriber.end(DROPPED)
+
+    def _notify(self, connection, pid, channel, payload):
+        self.publish(payload)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """
+        Stops listening and ends every open stream (after the frames already queued for it).
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(CLOSED)
+            except asyncio.QueueFull:
+                subscriber.end(CLOSED)
+        self.subscribers.clear()
+
+    async def _listen(self):
+        # 👇 A connection of its own (rather than one from the pool), since it stays checked out for as long as the api runs
+        config = engine_finder().config
+        while True:
+            lost = asyncio.Event()
+            try:
+                self._connection = await asyncpg.connect(**config)
+                self._connection.add_termination_listener(lambda _: lost.set())
+                await self._connection.add_listener(EVENT_CREATED_CHANNEL, self._notify)
+                self.listening = True
+                logger.info("Listening for new Events", extra={"channel": EVENT_CREATED_CHANNEL})
+                await lost.wait()
+                logger.warning("Lost the connection listening for new Events")
+            except asyncio.CancelledError:
+                if self._connection is not None:
+                    await self._connection.close()
+                raise
+            except Exception as e:
+                logger.error("Unable to listen for new Events", exc_info=e)
+            finally:
+                self.listening = False
+                self._connection = None
+            # 👇 Events inserted until the connection is back are not streamed; clients fill the gap from `GET /events`
+            self.reconnects += 1
+            await asyncio.sleep(EVENT_STREAM_RECONNECT_SECONDS)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": EVENT_STREAM,
+            "listening": self.listening,
+            "clients": len(self.subscribers),
+            "notifications": self.notifications,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "reconnects": self.reconnects,
+        }
+
+
+event_hub = EventHub(queue_size=EVENT_STREAM_QUEUE_SIZE, max_clients=EVENT_STREAM_MAX_CLIENTS)
+
+
+async def stream_events(request, subscriber: Subscriber):
+    """
+    Yields the frames queued for `subscriber` as they arrive, with a heartbeat whenever the stream has been idle for
+    `EVENT_STREAM_HEARTBEAT_SECONDS`, until it is dropped, the hub stops, or the client goes away.
+    """
+    loop = asyncio.get_running_loop()
+    checked_at = loop.time()
+    try:
+        # 👇 Sent at once, so that the client (and any proxy in between) sees the stream open before the first Event
+        yield b"retry: 1000\n\n"
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscriber.queue.get(), EVENT_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                frame = HEARTBEAT
+
+            # 👇 Writes to a client that has gone away are silently discarded, so the stream has to ask
+            if loop.time() - checked_at >= EVENT_STREAM_HEARTBEAT_SECONDS:
+                checked_at = loop.time()
+                if await request.is_disconnected():
+                    return
+
+            yield frame
+            if frame is DROPPED or frame is CLOSED:
+                return
+    finally:
+        event_hub.unsubscribe(subscriber)
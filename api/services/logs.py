@@ -0,0 +1,200 @@
+from api.db.engine import DBTimer, db_timer
+from .serialization import dumps
+from blacksheep import Request
+from blacksheep.exceptions import HTTPException
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import logging
+import os
+import queue
+import random
+import sys
+import time
+
+# The lowest level that is logged: DEBUG, INFO, WARNING, or ERROR
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+# 👇 'json' writes one JSON object per line (for log shippers); 'text' is easier on the eyes locally
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+
+# The fraction of requests (0 to 1) whose DEBUG lines are logged; the rest are dropped before they are queued
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", 1.0))
+
+# The number of records that can wait for the writer thread; records logged while it is full are dropped
+LOG_QUEUE_MAX_SIZE = int(os.environ.get("LOG_QUEUE_MAX_SIZE", 10000))
+
+logger = logging.getLogger("api")
+
+# 👇 The attributes every LogRecord has; anything else on a record was passed in `extra` and is a structured field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class RequestContext:
+    """
+    What the log records of the current request are tagged with.
+    """
+    __slots__ = ("route", "sampled")
+
+    def __init__(self, route: str, sampled: bool):
+        self.route = route
+        self.sampled = sampled
+
+
+request_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
+def _sampled() -> bool:
+    return LOG_DEBUG_SAMPLE_RATE >= 1 or random.random() < LOG_DEBUG_SAMPLE_RATE
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Tags each record with the route and database time of the request it was logged in (both live in context
+    variables, so this must run before the record leaves the request's task) and drops unsampled DEBUG records.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = request_context.get()
+        if record.levelno <= logging.DEBUG and not (context.sampled if context else _sampled()):
+            return False
+
+        if context is not None and not hasattr(record, "route"):
+            record.route = context.route
+        timer = db_timer.get()
+        if timer is not None and not hasattr(record, "db_time_ms"):
+            record.db_time_ms = round(timer.seconds * 1000, 3)
+            record.db_queries = timer.queries
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread as they are: formatting happens on that thread, not the event loop. When the
+    queue is full, records are dropped (and counted) rather than waited on.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return dumps(entry)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(message)s")
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        fields = " ".join(f"{k}={v}" for k, v in vars(record).items() if k not in _RECORD_ATTRIBUTES)
+        return f"{line} {fields}" if fields else line
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def start_logging():
+    """
+    Routes the `api` logger through a bounded queue to a background thread that formats the records and writes them
+    to stdout, so that a request never waits on a log write.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_MAX_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(RequestContextFilter())
+
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(_queue_handler)
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+
+def stop_logging():
+    """
+    Writes out the records still in the queue and stops the writer thread.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logger.removeHandler(_queue_handler)
+    _listener = None
+    _queue_handler = None
+
+
+def dropped_log_records() -> int:
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def track_routes(router):
+    """
+    Makes the router record the pattern of the route that matched each request on `request.route`
+    (https://www.neoteroi.dev/blacksheep/routing/#how-to-track-routes-that-matched-a-request).
+    """
+    get_match = router.get_match
+
+    def get_match_and_track(request: Request):
+        match = get_match(request)
+        request.route = match.pattern.decode() if match else "Not Found"
+        return match
+
+    router.get_match = get_match_and_track
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+async def log_requests(request: Request, handler):
+    """
+    Middleware that sets up the logging context of a request (its route, whether its DEBUG lines are sampled, and a
+    timer for its database time) and logs one line per request with the status and timings.
+    """
+    route = f"{request.method} {getattr(request, 'route', request.url.path.decode())}"
+    context_token = request_context.set(RequestContext(route=route, sampled=_sampled()))
+    timer_token = db_timer.set(DBTimer())
+    start = time.perf_counter()
+    try:
+        response = await handler(request)
+        logger.info("Request handled", extra={"status": response.status, "duration_ms": _elapsed_ms(start)})
+        return response
+    except HTTPException as e:
+        # 👇 e.g. `NotFound` for an unknown route; BlackSheep turns these into regular responses
+        logger.info("Request handled", extra={"status": e.status, "duration_ms": _elapsed_ms(start)})
+        raise
+    except Exception:
+        logger.exception("Request failed", extra={"status": 500, "duration_ms": _elapsed_ms(start)})
+        raise
+    finally:
+        db_timer.reset(timer_token)
+        request_context.reset(context_token)
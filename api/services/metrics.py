@@ -0,0 +1,214 @@
+from api.db.engine import DBTimer, db_timer
+from .admission import ADMISSION_CONTROL, admission_gates
+from .compression import COMPRESSION, compressed_bodies, compression_stats
+from .live import event_hub
+from blacksheep import Request
+from blacksheep.exceptions import HTTPException
+from bisect import bisect_left
+from piccolo.engine import engine_finder
+from typing import Optional
+import os
+import time
+
+# 👇 When true, every request is timed and the results are served at `GET /metrics`
+METRICS = os.environ.get("METRICS", "true").lower() == "true"
+
+# The upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    A Prometheus-style histogram with fixed buckets, one series per label set. Recording an observation is a binary
+    search and two additions; the counts are only made cumulative when rendered.
+    """
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # 👇 labels -> [count per bucket (the last one is +Inf), sum]
+        self._series: dict = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self, label_names: tuple) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._series.items():
+            label_text = _labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class Metrics:
+    """
+    The request metrics of this worker: latency and database time per route, responses per route and status, and
+    the number of requests in flight.
+    """
+    ROUTE_LABELS = ("method", "route")
+
+    def __init__(self):
+        self.request_duration = Histogram("http_request_duration_seconds", "Time spent handling requests, per route.")
+        self.request_db_duration = Histogram("http_request_db_seconds", "Time spent waiting on database queries while handling requests, per route.")
+        self.responses: dict = {}
+        self.in_flight = 0
+
+    def record(self, method: str, route: str, status: int, seconds: float, db_seconds: float):
+        labels = (method, route)
+        self.request_duration.observe(labels, seconds)
+        self.request_db_duration.observe(labels, db_seconds)
+        key = (method, route, status)
+        self.responses[key] = self.responses.get(key, 0) + 1
+
+    def render(
+        self, pools: Optional[dict] = None, gates: tuple = (), streams: Optional[dict] = None, compression: Optional[dict] = None
+    ) -> str:
+        lines = self.request_duration.render(self.ROUTE_LABELS)
+        lines += self.request_db_duration.render(self.ROUTE_LABELS)
+
+        lines += ["# HELP http_responses_total Responses sent, per route and status.", "# TYPE http_responses_total counter"]
+        for labels, count in self.responses.items():
+            lines.append(f"http_responses_total{{{_labels(('method', 'route', 'status'), labels)}}} {count}")
+
+        lines += [
+            "# HELP http_requests_in_flight Requests being handled right now.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+        ]
+
+        # 👇 One series per database node (the primary, and the read replica if there is one)
+        pool_gauges: dict = {}
+        for node, pool in (pools or {}).items():
+            for name, help, value in pool_stats(pool):
+                pool_gauges.setdefault((name, help), []).append((node, value))
+        for (name, help), values in pool_gauges.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{{{_labels(('node',), (node,))}}} {value}" for node, value in values]
+
+        # 👇 One series per admission gate (reads, writes, and any route with its own limit)
+        for name, help, kind in ADMISSION_GAUGES:
+            if gates:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}"]
+                lines += [f"{name}{{{_labels(('gate',), (gate.name,))}}} {getattr(gate, kind)}" for gate in gates]
+
+        for name, help, key in STREAM_GAUGES:
+            if streams:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}"]
+                lines.append(f"{name} {int(streams[key])}")
+
+        for name, help, key in COMPRESSION_COUNTERS:
+            if compression:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} counter", f"{name} {compression[key]}"]
+
+        return "\n".join(lines) + "\n"
+
+
+ADMISSION_GAUGES = (
+    ("admission_active", "Requests let through an admission gate and still being handled.", "active"),
+    ("admission_waiting", "Requests waiting for a slot at an admission gate.", "waiting"),
+    ("admission_limit", "The number of requests an admission gate lets through at once.", "limit"),
+    ("admission_rejected_total", "Requests answered with 503 after waiting too long at an admission gate.", "rejected"),
+)
+
+STREAM_GAUGES = (
+    ("event_stream_listening", "1 while the connection listening for new Events is up.", "listening"),
+    ("event_stream_clients", "Clients connected to `GET /events/stream`.", "clients"),
+    ("event_stream_delivered_total", "Events queued for a client of `GET /events/stream`.", "delivered"),
+    ("event_stream_dropped_total", "Clients of `GET /events/stream` disconnected for falling too far behind.", "dropped"),
+    ("event_stream_rejected_total", "Clients of `GET /events/stream` turned away because the worker was full.", "rejected"),
+)
+
+COMPRESSION_COUNTERS = (
+    ("compression_responses_total", "Responses sent compressed.", "responses"),
+    ("compression_bytes_in_total", "Bytes of response bodies before compression.", "bytes_in"),
+    ("compression_bytes_out_total", "Bytes of response bodies after compression.", "bytes_out"),
+    ("compression_threaded_total", "Response bodies compressed on a worker thread.", "threaded"),
+    ("compression_cache_hits_total", "Responses served with a compressed body kept from an earlier response.", "cache_hits"),
+)
+
+
+def pool_stats(pool) -> list:
+    """
+    Returns (name, help, value) for each gauge of an asyncpg connection pool.
+    """
+    stats = [
+        ("db_pool_size", "Connections open in the database pool.", pool.get_size()),
+        ("db_pool_idle", "Idle connections in the database pool.", pool.get_idle_size()),
+        ("db_pool_min_size", "The minimum size of the database pool.", pool.get_min_size()),
+        ("db_pool_max_size", "The maximum size of the database pool.", pool.get_max_size()),
+    ]
+    # 👇 asyncpg doesn't expose how many callers wait for a connection; its internal queue of them is the only source
+    waiters = getattr(getattr(pool, "_queue", None), "_getters", None)
+    if waiters is not None:
+        stats.append(("db_pool_waiting", "Callers waiting for a database connection.", len(waiters)))
+    return stats
+
+
+metrics = Metrics()
+
+
+def render_metrics() -> str:
+    """
+    Renders `metrics` and the gauges of the database connection pools in the Prometheus text format.
+    """
+    engine = engine_finder()
+    nodes = {"primary": engine, **getattr(engine, "extra_nodes", {})}
+    return metrics.render(
+        pools={name: node.pool for name, node in nodes.items() if getattr(node, "pool", None)},
+        gates=tuple(admission_gates()) if ADMISSION_CONTROL else (),
+        streams=event_hub.stats() if event_hub.running else None,
+        compression={
+            "responses": compression_stats.responses,
+            "bytes_in": compression_stats.bytes_in,
+            "bytes_out": compression_stats.bytes_out,
+            "threaded": compression_stats.threaded,
+            "cache_hits": compressed_bodies.hits,
+        } if COMPRESSION else None,
+    )
+
+
+async def record_metrics(request: Request, handler):
+    """
+    Middleware that times every request (and its database queries) into `metrics`.
+    """
+    if not METRICS:
+        return await handler(request)
+
+    # 👇 Shares the request's DBTimer when `log_requests` (which runs first) has set one up
+    timer: Optional[DBTimer] = db_timer.get()
+    timer_token = None
+    if timer is None:
+        timer = DBTimer()
+        timer_token = db_timer.set(timer)
+
+    metrics.in_flight += 1
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        metrics.in_flight -= 1
+        metrics.record(
+            request.method, getattr(request, "route", "Not Found"), status, time.perf_counter() - start, timer.seconds
+        )
+        if timer_token is not None:
+            db_timer.reset(timer_token)
@@ -0,0 +1,107 @@
+from api.db.partitions import EVENT_PARTITIONING
+from api.db.tables.event import Event, EventType
+from api.db.tables.person import Person
+from .events import event_keys_delete
+from .rollups import events_deleted_rollup_update
+from .summaries import events_created_upsert
+from datetime import datetime
+from piccolo.query import Select
+from piccolo.query.methods.raw import Raw
+from piccolo.querystring import QueryString
+import os
+import uuid
+
+# 👇 When true, a Person's `events` are read from the `event` table instead of the `person.events` JSONB copy
+PERSON_EVENTS_PROJECTION = os.environ.get("PERSON_EVENTS_PROJECTION", "false").lower() == "true"
+
+# The number of (newest) Events included in a Person when `PERSON_EVENTS_PROJECTION` is true
+PERSON_EVENTS_LIMIT = int(os.environ.get("PERSON_EVENTS_LIMIT", 50))
+
+
+def events_projection() -> QueryString:
+    """
+    A select column that aggregates the newest `PERSON_EVENTS_LIMIT` Events of each Person into a JSON array,
+    named `events` so that it takes the place of the JSONB column.
+    """
+    event_columns = ", ".join(f'"{c._meta.db_column_name}"' for c in Event._meta.columns)
+    return QueryString(
+        "COALESCE(("
+        f"SELECT json_agg(e) FROM (SELECT {event_columns} FROM \"event\" "
+        'WHERE "event"."person_id" = "person"."id" '
+        'ORDER BY "event"."datetime_created" DESC, "event"."id" DESC LIMIT {}) AS e'
+        "), '[]'::json) AS \"events\"",
+        PERSON_EVENTS_LIMIT,
+    )
+
+
+def person_select() -> Select:
+    """
+    Selects Persons with their `events`. The Events come from the JSONB copy on the Person by default, or from
+    one aggregated subquery against the `event` table when `PERSON_EVENTS_PROJECTION` is true. Either way,
+    `events` is returned as a JSON string in the same place.
+    """
+    if not PERSON_EVENTS_PROJECTION:
+        return Person.select()
+
+    # 👇 Keeps the usual column order, with the projection standing in for `Person.events`
+    return Person.select(
+        *[events_projection() if c is Person.events else c for c in Person._meta.columns]
+    )
+
+
+def new_signup_event(person_id) -> dict:
+    """
+    The 'signup' Event every Person is created with.
+    """
+    return Event(
+        id=uuid.uuid4(),
+        datetime_created=datetime.utcnow(),
+        event_type=EventType.SIGNUP.value,
+        person_id=person_id
+    ).to_dict()
+
+
+async def create_person(person: Person) -> dict:
+    """
+    Creates a Person together with its 'signup' Event and its Event summary, and returns the created Person with
+    the signup Event in `events`.
+
+    The three inserts are chained as data-modifying CTEs in one statement: it takes a single round trip, and
+    Postgres applies all of it or none of it, so a Person can never exist without its signup Event.
+    """
+    signup_event = new_signup_event(person.id)
+
+    # 👇 With the projection, the signup Event is read back from the `event` table; there is no copy to keep in sync
+    person.events = [] if PERSON_EVENTS_PROJECTION else [signup_event]
+
+    rows = await Person.raw(
+        'WITH "created_person" AS ({}), "signup_event" AS ({}), "summary" AS ({}) SELECT * FROM "created_person"',
+        Person.insert(person).returning(*Person._meta.columns).querystrings[0],
+        Event.insert(Event(**signup_event)).querystrings[0],
+        events_created_upsert([signup_event]),
+    ).run()
+
+    created_person = rows[0]
+    created_person['events'] = [signup_event]
+    return created_person
+
+
+def delete_person_query(id) -> Raw:
+    keys = ', "keys" AS ({})' if EVENT_PARTITIONING else ""
+    return Person.raw(
+        'WITH "deleted_events" AS ({}), "rollups" AS ({})' + keys + ', "deleted_person" AS ({}) SELECT * FROM "deleted_person"',
+        Event.delete().where(Event.person_id == id).returning(Event.id, Event.datetime_created, Event.event_type).querystrings[0],
+        events_deleted_rollup_update("deleted_events"),
+        *([event_keys_delete("deleted_events")] if EVENT_PARTITIONING else []),
+        Person.delete().where(Person.id == id).returning(Person.id).querystrings[0],
+    )
+
+
+async def delete_person(id) -> bool:
+    """
+    Deletes a Person and its Events in a single statement, taking the Events out of the Event rollups too, and
+    returns whether the Person existed. The Events are deleted explicitly (rather than left to the foreign key's
+    cascade) so that the statement can see which buckets they were counted in.
+    """
+    rows = await delete_person_query(id).run()
+    return bool(rows)
@@ -0,0 +1,72 @@
+from blacksheep import Cookie, Request
+from contextvars import ContextVar
+from piccolo.engine import engine_finder
+from typing import Optional
+import os
+import time
+
+# 👇 How long (in seconds) a client's reads go to the primary after it writes, so that replication lag can't hide its own writes from it
+DB_READ_STICKY_SECONDS = int(os.environ.get("DB_READ_STICKY_SECONDS", 5))
+
+# The name of the replica in `extra_nodes` (see `piccolo_conf.py`)
+READ_NODE = "read"
+
+# 👇 Holds the time (in seconds since the epoch) until which the client reads from the primary
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+WRITE_METHODS = {"DELETE", "PATCH", "POST", "PUT"}
+
+# 👇 True while handling a request from a client that wrote within the last `DB_READ_STICKY_SECONDS`
+read_from_primary: ContextVar[bool] = ContextVar("read_from_primary", default=False)
+
+_has_read_replica: Optional[bool] = None
+
+
+def has_read_replica() -> bool:
+    global _has_read_replica
+    if _has_read_replica is None:
+        _has_read_replica = READ_NODE in getattr(engine_finder(), "extra_nodes", {})
+    return _has_read_replica
+
+
+def read_node() -> Optional[str]:
+    """
+    Returns the node a read-only query of the current request should run on: the replica, unless there isn't one
+    or the client has just written something (`None` is the primary). Pass it on as `.run(node=read_node())`.
+    """
+    if read_from_primary.get() or not has_read_replica():
+        return None
+    return READ_NODE
+
+
+def _sticky(request: Request) -> bool:
+    until = request.cookies.get(READ_PRIMARY_COOKIE)
+    try:
+        return until is not None and float(until) > time.time()
+    except ValueError:
+        return False
+
+
+async def route_reads(request: Request, handler):
+    """
+    Middleware that sends a client's reads to the primary for `DB_READ_STICKY_SECONDS` after each successful write
+    it makes. The window is kept in a cookie, so it holds whichever worker handles the next request.
+    """
+    if not has_read_replica():
+        return await handler(request)
+
+    token = read_from_primary.set(_sticky(request))
+    try:
+        response = await handler(request)
+    finally:
+        read_from_primary.reset(token)
+
+    if request.method in WRITE_METHODS and response.status < 400 and DB_READ_STICKY_SECONDS > 0:
+        response.set_cookie(Cookie(
+            READ_PRIMARY_COOKIE,
+            f"{time.time() + DB_READ_STICKY_SECONDS:.3f}",
+            path="/",
+            http_only=True,
+            max_age=DB_READ_STICKY_SECONDS,
+        ))
+    return response
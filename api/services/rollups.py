@@ -0,0 +1,182 @@
+from api.db.tables.event_rollup import Bucket, EventRollup
+from .logs import logger
+from datetime import datetime, timedelta, timezone
+from piccolo.querystring import QueryString
+from typing import Optional
+import asyncio
+import os
+
+# How often (in seconds) the rollup scheduler rolls completed buckets up; 0 turns the scheduler off
+EVENT_ROLLUP_INTERVAL_SECONDS = int(os.environ.get("EVENT_ROLLUP_INTERVAL_SECONDS", 60))
+
+# 👇 Completed buckets are rolled up again this many times, so Events that arrive a little late are still counted
+EVENT_ROLLUP_LOOKBACK_BUCKETS = int(os.environ.get("EVENT_ROLLUP_LOOKBACK_BUCKETS", 2))
+
+# 👇 The longest span of Events (in days) counted in one transaction; a backlog (e.g. on the very first pass) is rolled up in batches
+EVENT_ROLLUP_BATCH_DAYS = int(os.environ.get("EVENT_ROLLUP_BATCH_DAYS", 7))
+
+# The largest number of buckets a single `GET /events/stats` request may return
+EVENT_STATS_MAX_BUCKETS = int(os.environ.get("EVENT_STATS_MAX_BUCKETS", 1440))
+
+# The number of buckets returned by `GET /events/stats` when no `from` is given
+EVENT_STATS_DEFAULT_BUCKETS = 60
+
+BUCKET_SIZES = {
+    Bucket.MINUTE.value: timedelta(minutes=1),
+    Bucket.HOUR.value: timedelta(hours=1),
+    Bucket.DAY.value: timedelta(days=1),
+}
+
+# 👇 Only one worker rolls up at a time; the others skip the pass
+ROLLUP_LOCK_KEY = 7_007_001
+
+
+def truncate(value: datetime, bucket: str) -> datetime:
+    """
+    Returns the start of the bucket `value` falls in (the Python equivalent of Postgres' `date_trunc`).
+    """
+    if bucket == Bucket.MINUTE.value:
+        return value.replace(second=0, microsecond=0)
+    if bucket == Bucket.HOUR.value:
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def _roll_up_span(bucket: str, start: datetime, end: datetime) -> bool:
+    """
+    Upserts the counts of the `bucket` buckets from `start` to `end` in one transaction. Returns `False` (without
+    counting anything) if another worker is rolling up.
+    """
+    async with EventRollup._meta.db.transaction():
+        lock = await EventRollup.raw("SELECT pg_try_advisory_xact_lock({}) AS \"locked\"", ROLLUP_LOCK_KEY).run()
+        if not lock[0]["locked"]:
+            return False
+
+        await EventRollup.raw(
+            'INSERT INTO "event_rollup" ("id", "bucket", "count", "datetime_bucket", "event_type") '
+            'SELECT gen_random_uuid(), {}, COUNT(*), date_trunc({}, "datetime_created"), "event_type" FROM "event" '
+            'WHERE "datetime_created" >= {} AND "datetime_created" < {} GROUP BY 4, 5 '
+            'ON CONFLICT ("bucket", "datetime_bucket", "event_type") DO UPDATE SET "count" = EXCLUDED."count"',
+            bucket, bucket, start, end
+        ).run()
+    return True
+
+
+async def roll_up_events():
+    """
+    Counts the Events in every completed bucket since the last pass (plus `EVENT_ROLLUP_LOOKBACK_BUCKETS`) and
+    upserts the counts into `event_rollup`. The bucket in progress is never rolled up; `event_stats` counts it
+    from the `event` table instead. Spans longer than `EVENT_ROLLUP_BATCH_DAYS` are rolled up in batches, each in
+    a transaction of its own, so no single transaction (or advisory lock) grows with the size of the backlog.
+    """
+    now = datetime.utcnow()
+    for bucket, size in BUCKET_SIZES.items():
+        latest = await EventRollup.raw(
+            'SELECT MAX("datetime_bucket") AS "latest" FROM "event_rollup" WHERE "bucket" = {}', bucket
+        ).run()
+        latest = latest[0]["latest"]
+        if latest:
+            start = latest - size * EVENT_ROLLUP_LOOKBACK_BUCKETS
+        else:
+            # 👇 The very first pass backfills everything in the `event` table, from its oldest Event (an index seek)
+            oldest = await EventRollup.raw('SELECT MIN("datetime_created") AS "oldest" FROM "event"').run()
+            if oldest[0]["oldest"] is None:
+                continue
+            start = truncate(oldest[0]["oldest"], bucket)
+
+        end = truncate(now, bucket)
+        batch = max(size, timedelta(days=EVENT_ROLLUP_BATCH_DAYS))
+        while start < end:
+            stop = min(start + batch, end)
+            if not await _roll_up_span(bucket, start, stop):
+                return
+            start = stop
+
+
+def events_deleted_rollup_update(deleted: str) -> QueryString:
+    """
+    The UPDATE that takes deleted Events out of the buckets already rolled up, where `deleted` names the relation
+    holding the deleted Event rows (e.g. the CTE of a `DELETE ... RETURNING`). A bucket that isn't rolled up yet has
+    no row to update; it will be counted from the `event` table, which no longer holds the Events.
+    """
+    sizes = ", ".join(f"('{bucket}')" for bucket in BUCKET_SIZES)
+    return QueryString(
+        'UPDATE "event_rollup" SET "count" = GREATEST("event_rollup"."count" - "removed"."count", 0) FROM ('
+        f'SELECT "sizes"."bucket", date_trunc("sizes"."bucket", "{deleted}"."datetime_created") AS "datetime_bucket", '
+        f'"{deleted}"."event_type", COUNT(*) AS "count" FROM "{deleted}" CROSS JOIN (VALUES {sizes}) AS "sizes" ("bucket") '
+        'GROUP BY 1, 2, 3'
+        ') AS "removed" WHERE "event_rollup"."bucket" = "removed"."bucket" '
+        'AND "event_rollup"."datetime_bucket" = "removed"."datetime_bucket" AND "event_rollup"."event_type" = "removed"."event_type"'
+    )
+
+
+async def run_rollup_scheduler():
+    """
+    Rolls Events up every `EVENT_ROLLUP_INTERVAL_SECONDS` until cancelled.
+    """
+    while True:
+        try:
+            await roll_up_events()
+        except Exception as e:
+            logger.error("Unable to roll up Events", exc_info=e)
+        await asyncio.sleep(EVENT_ROLLUP_INTERVAL_SECONDS)
+
+
+async def event_stats(bucket: str, start: datetime, end: datetime, event_type: Optional[str] = None, person_id: Optional[str] = None, node: Optional[str] = None) -> list:
+    """
+    Counts Events per bucket for every bucket that contains a moment between `start` and `end`, oldest first
+    (buckets with no Events have a count of 0). Raises a `ValueError` if the request is invalid.
+
+    Completed buckets are read from `event_rollup`; anything newer than the latest rollup (at least the bucket
+    in progress) is counted from the `event` table. Counts for a single Person are always read from the `event`
+    table, which the (`person_id`, `datetime_created`) index keeps cheap. `node` picks the database node the counts
+    are read from (the primary by default).
+    """
+    if bucket not in BUCKET_SIZES:
+        raise ValueError(f"`bucket` must be one of {list(BUCKET_SIZES)}.")
+
+    # 👇 Event datetimes are stored as naive UTC
+    start, end = [d.astimezone(timezone.utc).replace(tzinfo=None) if d.tzinfo else d for d in (start, end)]
+    if start > end:
+        raise ValueError("`from` must not be after `to`.")
+
+    size = BUCKET_SIZES[bucket]
+    first, last = truncate(start, bucket), truncate(end, bucket)
+    stop = last + size
+    if (last - first) // size + 1 > EVENT_STATS_MAX_BUCKETS:
+        raise ValueError(f"A request may cover at most {EVENT_STATS_MAX_BUCKETS} buckets of one {bucket}.")
+
+    event_type_filter = ' AND "event_type" = {}' if event_type else ""
+    event_type_args = [event_type] if event_type else []
+
+    if person_id:
+        rows = await EventRollup.raw(
+            'SELECT date_trunc({}, "datetime_created") AS "datetime_bucket", COUNT(*) AS "count" FROM "event" '
+            'WHERE "person_id" = {} AND "datetime_created" >= {} AND "datetime_created" < {}' + event_type_filter + ' GROUP BY 1',
+            bucket, person_id, first, stop, *event_type_args
+        ).run(node=node)
+    else:
+        # 👇 The watermark is the end of the latest rolled-up bucket: rollups before it, raw Events after it
+        rows = await EventRollup.raw(
+            'WITH "watermark" AS ('
+            'SELECT LEAST(GREATEST(COALESCE(MAX("datetime_bucket") + {}::interval, {}), {}), {}) AS "w" '
+            'FROM "event_rollup" WHERE "bucket" = {}) '
+            'SELECT "datetime_bucket", SUM("count")::bigint AS "count" FROM ('
+            'SELECT "datetime_bucket", "count" FROM "event_rollup", "watermark" '
+            'WHERE "bucket" = {} AND "datetime_bucket" >= {} AND "datetime_bucket" < "watermark"."w"' + event_type_filter + ' '
+            'UNION ALL '
+            'SELECT date_trunc({}, "datetime_created") AS "datetime_bucket", COUNT(*) AS "count" FROM "event", "watermark" '
+            'WHERE "datetime_created" >= "watermark"."w" AND "datetime_created" < {}' + event_type_filter + ' GROUP BY 1'
+            ') AS "counts" GROUP BY 1',
+            size, first, first, stop, bucket,
+            bucket, first, *event_type_args,
+            bucket, stop, *event_type_args
+        ).run(node=node)
+
+    counts = {row["datetime_bucket"]: row["count"] for row in rows}
+    stats = []
+    current = first
+    while current <= last:
+        stats.append({"datetime_bucket": current, "count": counts.get(current, 0)})
+        current += size
+    return stats
@@ -0,0 +1,63 @@
+from api.db.tables.person import Person
+from .pagination import PAGE_SIZE_DEFAULT, decode_cursor
+from .persons import person_select
+from piccolo.columns.combination import WhereRaw
+from piccolo.query import Select
+from typing import Optional
+
+# 👇 A trigram index can only narrow down a substring match of at least 3 characters; shorter queries match prefixes only
+PERSON_SEARCH_SUBSTRING_MIN_LENGTH = 3
+
+# The longest search query accepted; the searched columns are at most 40 characters long
+PERSON_SEARCH_MAX_LENGTH = 40
+
+# 👇 The columns with a trigram index (see `api/db/indexes.py`) are the ones searched
+PERSON_SEARCH_COLUMNS = tuple(Person.trigram_indexes)
+
+
+def search_query(q: Optional[str]) -> str:
+    """
+    Normalizes a search query (trimmed and lowercased), raising a `ValueError` if it is missing or too long.
+    """
+    query = (q or "").strip().lower()
+    if not query:
+        raise ValueError("`q` is required.")
+    if len(query) > PERSON_SEARCH_MAX_LENGTH:
+        raise ValueError(f"`q` must be at most {PERSON_SEARCH_MAX_LENGTH} characters long.")
+    return query
+
+
+def like_pattern(query: str) -> str:
+    """
+    The `LIKE` pattern for a normalized query: a substring match, or a prefix match for a query too short for the
+    trigram indexes to narrow down. `%`, `_`, and `\\` in the query are matched literally.
+    """
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%" if len(query) >= PERSON_SEARCH_SUBSTRING_MIN_LENGTH else f"{escaped}%"
+
+
+def person_search_select(q: str, limit: int = PAGE_SIZE_DEFAULT, cursor: Optional[str] = None) -> Select:
+    """
+    Selects the Persons (like `person_select`) whose email, first name, or last name matches the search query, for
+    the page `paginate` reads with the same `limit` and `cursor`. Each column is compared lowercased, the way its
+    trigram index is built.
+
+    Each column finds its own first `limit + 1` matches after the cursor, so Postgres can pick, per column, between
+    the trigram index (few matches) and walking the (`datetime_created`, `id`) index until the page is full (many
+    matches). The page is then read from the union of those, at most three pages' worth of ids.
+    """
+    pattern = like_pattern(search_query(q))
+    keyset, keyset_args = "", []
+    if cursor:
+        datetime_created, id = decode_cursor(cursor)
+        keyset, keyset_args = ' AND ("datetime_created", "id") > ({}, {})', [datetime_created, id]
+
+    branches, args = [], []
+    for column in PERSON_SEARCH_COLUMNS:
+        # 👇 The limit is written into the query (it is an int) so the planner can weigh it when it picks an index
+        branches.append(
+            f'(SELECT "id" FROM "person" WHERE lower("{column}") LIKE {{}}{keyset} '
+            f'ORDER BY "datetime_created", "id" LIMIT {int(limit) + 1})'
+        )
+        args += [pattern, *keyset_args]
+    return person_select().where(WhereRaw(f'"person"."id" IN ({" UNION ".join(branches)})', *args))
@@ -0,0 +1,92 @@
+from blacksheep.settings.json import default_json_dumps, json_settings
+from datetime import timedelta
+from decimal import Decimal
+from enum import Enum
+import base64
+import dataclasses
+import json
+import os
+import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 👇 'orjson' (the default when it's installed) or 'json' (the standard library encoder BlackSheep uses out of the box)
+JSON_SERIALIZER = os.environ.get("JSON_SERIALIZER", "orjson" if orjson else "json")
+
+
+def _orjson_default(obj):
+    """
+    Encodes the types orjson doesn't handle itself the same way BlackSheep's default encoder does.
+    """
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "dict"):
+        return obj.dict()
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, bytes):
+        return base64.urlsafe_b64encode(obj).decode("utf8")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _dumps_json(obj) -> bytes:
+    return default_json_dumps(obj).encode("utf8")
+
+
+def _dumps_orjson(obj) -> bytes:
+    try:
+        return orjson.dumps(obj, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # 👇 e.g. an integer wider than 64 bits; the standard library encoder copes with anything BlackSheep's does
+        return _dumps_json(obj)
+
+
+SERIALIZERS = {
+    "json": _dumps_json,
+    "orjson": _dumps_orjson,
+}
+
+
+def dumps_bytes(obj) -> bytes:
+    """
+    Serializes `obj` (e.g. a `custom_response` envelope) straight to UTF-8 JSON bytes with the configured serializer.
+
+    UUIDs, datetimes, and Enums are encoded natively by orjson, and the rows of a list response are written as they
+    are, without per-row copies. The output is byte-for-byte the same as BlackSheep's default encoder's (compact
+    separators, non-ASCII characters unescaped), with one exception: orjson writes floats that Python would print in
+    exponent notation in positional form (e.g. `0.00001` rather than `1e-05`).
+    """
+    return SERIALIZERS[JSON_SERIALIZER](obj)
+
+
+def dumps(obj) -> str:
+    return dumps_bytes(obj).decode("utf8")
+
+
+def loads(data):
+    """
+    Parses JSON (a `str` or `bytes`) with orjson when it's installed, or with the standard library otherwise.
+    """
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def use_json_serializer():
+    """
+    Makes BlackSheep encode every JSON response (`ok(message=...)` and friends) with the configured serializer.
+    """
+    if JSON_SERIALIZER not in SERIALIZERS:
+        raise ValueError(f"`JSON_SERIALIZER` must be one of {list(SERIALIZERS)}.")
+    if JSON_SERIALIZER == "orjson" and orjson is None:
+        raise ValueError("`JSON_SERIALIZER` is 'orjson' but orjson is not installed.")
+    json_settings.use(dumps=dumps)
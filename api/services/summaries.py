@@ -0,0 +1,97 @@
+from api.db.tables.event import Event, EventType
+from api.db.tables.person_event_summary import PersonEventSummary
+from piccolo.querystring import QueryString
+
+# 👇 The summary column that counts each EventType
+COUNT_COLUMNS = {e.value: f"{e.value}_count" for e in EventType}
+
+
+def _event_type(event: dict) -> str:
+    event_type = event["event_type"]
+    return event_type.value if isinstance(event_type, EventType) else EventType(event_type).value
+
+
+def events_created_upsert(events: list) -> QueryString:
+    """
+    The single upsert that adds newly-inserted Events (at least one) to their Persons' summaries.
+    """
+    # 👇 Fold the Events into one delta per Person first, so each summary row is touched once
+    deltas: dict = {}
+    for event in events:
+        delta = deltas.setdefault(event["person_id"], {
+            "counts": dict.fromkeys(COUNT_COLUMNS.values(), 0),
+            "first_seen": event["datetime_created"],
+            "last_seen": event["datetime_created"],
+        })
+        delta["counts"][COUNT_COLUMNS[_event_type(event)]] += 1
+        delta["first_seen"] = min(delta["first_seen"], event["datetime_created"])
+        delta["last_seen"] = max(delta["last_seen"], event["datetime_created"])
+
+    count_columns = list(COUNT_COLUMNS.values())
+    columns = ", ".join(f'"{c}"' for c in ["id", "person_id", *count_columns, "datetime_first_seen", "datetime_last_seen"])
+    row = "(gen_random_uuid(), {}, " + ", ".join("{}" for _ in count_columns) + ", {}, {})"
+    args = []
+    for person_id, delta in deltas.items():
+        args.extend([person_id, *[delta["counts"][c] for c in count_columns], delta["first_seen"], delta["last_seen"]])
+
+    updates = ", ".join(f'"{c}" = "person_event_summary"."{c}" + EXCLUDED."{c}"' for c in count_columns)
+    return QueryString(
+        f'INSERT INTO "person_event_summary" ({columns}) VALUES {", ".join(row for _ in deltas)} '
+        f'ON CONFLICT ("person_id") DO UPDATE SET {updates}, '
+        '"datetime_first_seen" = LEAST("person_event_summary"."datetime_first_seen", EXCLUDED."datetime_first_seen"), '
+        '"datetime_last_seen" = GREATEST("person_event_summary"."datetime_last_seen", EXCLUDED."datetime_last_seen")',
+        *args
+    )
+
+
+async def record_events_created(events: list):
+    """
+    Adds newly-inserted Events to their Persons' summaries with a single upsert. Call this inside the
+    transaction that inserted the Events so that the summaries can never drift from the `event` table.
+    """
+    if not events:
+        return
+
+    await PersonEventSummary.raw("{}", events_created_upsert(events)).run()
+
+
+def event_deleted_update(deleted: str) -> QueryString:
+    """
+    The UPDATE that removes a deleted Event from its Person's summary, where `deleted` names the relation holding
+    the deleted Event row (e.g. the CTE of a `DELETE ... RETURNING`). The first/last seen datetimes are only looked
+    up again (with an index seek) if the deleted Event was the oldest or newest one.
+    """
+    # 👇 Statements in one query share a snapshot, so the lookups still see the deleted Event and must skip it
+    counts = ", ".join(
+        f'"{column}" = GREATEST("person_event_summary"."{column}" - ("{deleted}"."event_type" = \'{event_type}\')::int, 0)'
+        for event_type, column in COUNT_COLUMNS.items()
+    )
+    return QueryString(
+        f'UPDATE "person_event_summary" SET {counts}, '
+        f'"datetime_first_seen" = CASE WHEN "person_event_summary"."datetime_first_seen" = "{deleted}"."datetime_created" '
+        f'THEN (SELECT MIN("datetime_created") FROM "event" WHERE "person_id" = "{deleted}"."person_id" AND "id" <> "{deleted}"."id") '
+        'ELSE "person_event_summary"."datetime_first_seen" END, '
+        f'"datetime_last_seen" = CASE WHEN "person_event_summary"."datetime_last_seen" = "{deleted}"."datetime_created" '
+        f'THEN (SELECT MAX("datetime_created") FROM "event" WHERE "person_id" = "{deleted}"."person_id" AND "id" <> "{deleted}"."id") '
+        'ELSE "person_event_summary"."datetime_last_seen" END '
+        f'FROM "{deleted}" WHERE "person_event_summary"."person_id" = "{deleted}"."person_id"'
+    )
+
+
+async def rebuild_person_event_summaries():
+    """
+    Recomputes every Person's summary from the `event` table (for backfills, or if the summaries are ever
+    suspected to be wrong).
+    """
+    counts = ", ".join(
+        f'COUNT(*) FILTER (WHERE "event_type" = \'{event_type}\') AS "{column}"'
+        for event_type, column in COUNT_COLUMNS.items()
+    )
+    columns = ", ".join(f'"{c}"' for c in COUNT_COLUMNS.values())
+    async with Event._meta.db.transaction():
+        await PersonEventSummary.raw('DELETE FROM "person_event_summary"').run()
+        await PersonEventSummary.raw(
+            f'INSERT INTO "person_event_summary" ("id", "person_id", {columns}, "datetime_first_seen", "datetime_last_seen") '
+            f'SELECT gen_random_uuid(), "person_id", {counts}, MIN("datetime_created"), MAX("datetime_created") '
+            'FROM "event" GROUP BY "person_id"'
+        ).run()
@@ -0,0 +1,6 @@
+#! /bin/sh
+
+# Lets the read replica (the `db-replica` service) stream changes from this database. It runs by itself when the
+# `db` volume is first created; for an existing volume, run `docker compose exec db sh /docker-entrypoint-initdb.d/allow-replication.sh`.
+grep -q "^host replication" "$PGDATA/pg_hba.conf" || echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
+psql --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" --command "SELECT pg_reload_conf()"
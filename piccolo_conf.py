@@ -1,7 +1,7 @@
 import os
+from api.db.engine import TimedPostgresEngine
 from dotenv import load_dotenv
 from piccolo.conf.apps import AppRegistry
-from piccolo.engine.postgres import PostgresEngine
 
 load_dotenv()
 
@@ -11,12 +11,40 @@ DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
 DB_PORT = os.getenv("DB_PORT")
 
-DB = PostgresEngine(config={
+# 👇 Every worker process has its own pool, so keep (workers × DB_POOL_MAX_SIZE) below Postgres' `max_connections`
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 10))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+
+# 👇 An optional read replica; when `DB_READ_HOST` is set, the GET routes of `/persons` and `/events` read from it
+DB_READ_HOST = os.getenv("DB_READ_HOST")
+DB_READ_NAME = os.getenv("DB_READ_NAME", DB_NAME)
+DB_READ_USER = os.getenv("DB_READ_USER", DB_USER)
+DB_READ_PASS = os.getenv("DB_READ_PASS", DB_PASS)
+DB_READ_PORT = os.getenv("DB_READ_PORT", DB_PORT)
+
+POOL_CONFIG = {
+    'max_size': DB_POOL_MAX_SIZE,
+    'min_size': min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+}
+
+# 👇 Queries run here unless they ask for the replica with `.run(node="read")`
+EXTRA_NODES = {
+    'read': TimedPostgresEngine(config={
+        'database': DB_READ_NAME,
+        'host': DB_READ_HOST,
+        'password': DB_READ_PASS,
+        'port': DB_READ_PORT,
+        'user': DB_READ_USER,
+    }, pool_config=POOL_CONFIG),
+} if DB_READ_HOST else {}
+
+# 👇 A PostgresEngine that also records how long each request spends waiting on the database
+DB = TimedPostgresEngine(config={
     'database': DB_NAME,
     'host': DB_HOST,
     'password': DB_PASS,
     'port': DB_PORT,
     'user': DB_USER,
-})
+}, pool_config=POOL_CONFIG, extra_nodes=EXTRA_NODES)
 
 APP_REGISTRY = AppRegistry(apps=['api.db.piccolo_app'])